@@ -0,0 +1,99 @@
+"""baseline, the schema as created by create_all before migrations
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:00:00
+
+Databases created by the old create_all at startup already have these
+tables, mark them with `alembic stamp 0001` and upgrade from there.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('firstname', sa.String(), nullable=True),
+        sa.Column('lastname', sa.String(), nullable=True),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'otp_records',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('otp', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'projects',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('brief_description', sa.Text(), nullable=True),
+        sa.Column('detailed_description', sa.Text(), nullable=True),
+        sa.Column('created_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('mimetype', sa.String(), nullable=True),
+        sa.Column('image_data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_images_id'), 'images', ['id'], unique=False)
+    op.create_table(
+        'todos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_title', sa.String(), nullable=False),
+        sa.Column('task_description', sa.Text(), nullable=True),
+        sa.Column('completed', sa.Boolean(), nullable=True),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'resources',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resource_title', sa.String(), nullable=False),
+        sa.Column('resource_description', sa.Text(), nullable=True),
+        sa.Column('link', sa.String(), nullable=True),
+        sa.Column('resource_type', sa.String(), nullable=True),
+        sa.Column('todo_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['todo_id'], ['todos.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('resources')
+    op.drop_table('todos')
+    op.drop_index(op.f('ix_images_id'), table_name='images')
+    op.drop_table('images')
+    op.drop_table('projects')
+    op.drop_table('otp_records')
+    op.drop_table('users')
@@ -0,0 +1,48 @@
+"""image blob store keys and thumbnail variants
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+Moving the bytes of existing images is a data migration,
+run `python -m app.cli migrate-images` after upgrading.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.add_column(sa.Column('blob_key', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.Integer(), nullable=True))
+
+    op.create_table(
+        'image_variants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('size', sa.String(), nullable=False),
+        sa.Column('mimetype', sa.String(), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('blob_key', sa.String(length=64), nullable=False),
+        sa.Column('image_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['image_id'], ['images.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_image_variants_image_id'), 'image_variants', ['image_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_image_variants_image_id'), table_name='image_variants')
+    op.drop_table('image_variants')
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('size')
+        batch_op.drop_column('blob_key')
@@ -0,0 +1,36 @@
+"""indexes on the foreign keys and lookup columns the routers filter on
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('projects', 'user_id'),
+    ('todos', 'project_id'),
+    ('resources', 'todo_id'),
+    ('images', 'user_id'),
+    ('otp_records', 'otp'),
+    ('otp_records', 'email'),
+]
+
+
+def upgrade() -> None:
+    for table, column in INDEXES:
+        op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False)
+
+
+def downgrade() -> None:
+    for table, column in reversed(INDEXES):
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
@@ -0,0 +1,41 @@
+"""progress counters on projects
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ['todo_count', 'completed_todo_count', 'resource_count']
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('projects') as batch_op:
+        for counter in COUNTERS:
+            batch_op.add_column(sa.Column(counter, sa.Integer(), server_default='0', nullable=False))
+
+    # backfill, `python -m app.cli rebuild-counters` does the same for a live database
+    op.execute(
+        "UPDATE projects SET "
+        "todo_count = (SELECT count(*) FROM todos WHERE todos.project_id = projects.id), "
+        "completed_todo_count = (SELECT count(*) FROM todos WHERE todos.project_id = projects.id AND todos.completed), "
+        "resource_count = (SELECT count(*) FROM resources JOIN todos ON todos.id = resources.todo_id "
+        "WHERE todos.project_id = projects.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('projects') as batch_op:
+        for counter in reversed(COUNTERS):
+            batch_op.drop_column(counter)
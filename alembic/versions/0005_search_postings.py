@@ -0,0 +1,39 @@
+"""full-text search postings
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:50:00
+
+Indexing the existing projects, todos and resources is a data migration,
+run `python -m app.cli rebuild-search-index` after upgrading.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'search_postings',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('term', sa.String(length=64), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('doc_id', sa.Integer(), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id', 'term', 'kind', 'doc_id'),
+    )
+    op.create_index('ix_search_postings_kind_doc_id', 'search_postings', ['kind', 'doc_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_search_postings_kind_doc_id', table_name='search_postings')
+    op.drop_table('search_postings')
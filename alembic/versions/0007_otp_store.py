@@ -0,0 +1,39 @@
+"""one-time codes keyed by (email, code) with an expiry
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:10:00
+
+Outstanding codes are dropped, they were valid for ten minutes and
+users can ask for a new one with /auth/resend_otp.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DELETE FROM otp_records")
+    op.drop_index('ix_otp_records_otp', table_name='otp_records')
+    op.drop_index('ix_otp_records_email', table_name='otp_records')
+    with op.batch_alter_table('otp_records') as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False))
+    op.create_index('ix_otp_records_email_otp', 'otp_records', ['email', 'otp'], unique=False)
+    op.create_index(op.f('ix_otp_records_expires_at'), 'otp_records', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_otp_records_expires_at'), table_name='otp_records')
+    op.drop_index('ix_otp_records_email_otp', table_name='otp_records')
+    with op.batch_alter_table('otp_records') as batch_op:
+        batch_op.drop_column('expires_at')
+    op.create_index('ix_otp_records_email', 'otp_records', ['email'], unique=False)
+    op.create_index('ix_otp_records_otp', 'otp_records', ['otp'], unique=False)
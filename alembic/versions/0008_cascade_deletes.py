@@ -0,0 +1,59 @@
+"""ON DELETE CASCADE foreign keys and pending account deletions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:00:00
+
+Resources left without a todo by the old delete_todo, which detached them,
+were unreachable and are deleted with their search postings.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table, column, referred table
+FOREIGN_KEYS = [
+    ('projects', 'user_id', 'users'),
+    ('todos', 'project_id', 'projects'),
+    ('resources', 'todo_id', 'todos'),
+    ('search_postings', 'user_id', 'users'),
+    ('images', 'user_id', 'users'),
+    ('image_variants', 'image_id', 'images'),
+]
+
+# names the unnamed sqlite constraints so batch mode can drop them
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def replace_foreign_key(table: str, column: str, referred: str, ondelete: str | None) -> None:
+    name = f'fk_{table}_{column}_{referred}'
+    existing = [fk['name'] for fk in sa.inspect(op.get_bind()).get_foreign_keys(table) if fk['constrained_columns'] == [column]]
+    with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(existing[0] or name, type_='foreignkey')
+        batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    op.execute("DELETE FROM search_postings WHERE kind = 'resource' AND doc_id IN (SELECT id FROM resources WHERE todo_id IS NULL)")
+    op.execute("DELETE FROM resources WHERE todo_id IS NULL")
+    for table, column, referred in FOREIGN_KEYS:
+        replace_foreign_key(table, column, referred, 'CASCADE')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_users_deleted_at'), 'users', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_deleted_at'), table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('deleted_at')
+    for table, column, referred in FOREIGN_KEYS:
+        replace_foreign_key(table, column, referred, None)
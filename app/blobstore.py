@@ -0,0 +1,154 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.config import BLOB_STORE_BACKEND, BLOB_STORE_PATH
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLarge(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"blob is larger than {max_size} bytes")
+        self.max_size = max_size
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed storage: a blob's key is the sha256 of its contents,
+    so identical uploads are stored once and a key never changes meaning.
+    """
+
+    @abstractmethod
+    def put_file(self, src: BinaryIO, max_size: int | None = None) -> tuple[str, int]:
+        """Copy a readable file into the store, returns (key, size)."""
+
+    @abstractmethod
+    def put_bytes(self, data: bytes) -> tuple[str, int]:
+        ...
+
+    @abstractmethod
+    def path(self, key: str) -> str:
+        """Local path of a blob, for stores that can serve straight from disk."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    async def put_upload(self, src: BinaryIO, max_size: int | None = None) -> tuple[str, int]:
+        # one thread hop for the whole copy rather than one per chunk
+        return await run_in_threadpool(self.put_file, src, max_size)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs under `root` fanned out as ab/cd/abcd..., written to a temp file and renamed into place."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def put_file(self, src: BinaryIO, max_size: int | None = None) -> tuple[str, int]:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := src.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge(max_size)
+                    hasher.update(chunk)
+                    out.write(chunk)
+            key = hasher.hexdigest()
+            dest = self.path(key)
+            if os.path.exists(dest):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return key, size
+
+    def put_bytes(self, data: bytes) -> tuple[str, int]:
+        key = hashlib.sha256(data).hexdigest()
+        dest = self.path(key)
+        if not os.path.exists(dest):
+            fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)
+        return key, len(data)
+
+
+BLOB_STORES = {
+    "local": lambda: LocalBlobStore(BLOB_STORE_PATH),
+}
+
+_blob_store: BlobStore | None = None
+
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    if _blob_store is None:
+        if BLOB_STORE_BACKEND not in BLOB_STORES:
+            raise RuntimeError(f"unknown blob store backend '{BLOB_STORE_BACKEND}'")
+        _blob_store = BLOB_STORES[BLOB_STORE_BACKEND]()
+    return _blob_store
+
+
+def image_keys(*criteria):
+    """SELECT of the blob keys of the images matching `criteria` and of their thumbnails."""
+    return union(
+        select(models.ImageModel.blob_key).where(*criteria),
+        select(models.ImageVariant.blob_key).where(models.ImageVariant.image_id.in_(select(models.ImageModel.id).where(*criteria))),
+    )
+
+
+def referenced(keys: set[str]):
+    """SELECT of the `keys` an image or a thumbnail still points at."""
+    return union(
+        select(models.ImageModel.blob_key).where(models.ImageModel.blob_key.in_(keys)),
+        select(models.ImageVariant.blob_key).where(models.ImageVariant.blob_key.in_(keys)),
+    )
+
+
+async def release(db: AsyncSession, keys: Iterable[str | None]):
+    """
+    Delete the blobs among `keys` that no row references any more, run after the commit that
+    dropped the references. Identical uploads share a blob, so a key is only as dead as its last row.
+    """
+    keys = {key for key in keys if key}
+    if not keys:
+        return
+    unused = keys - set((await db.scalars(referenced(keys))).all())
+    if unused:
+        store = get_blob_store()
+        await run_in_threadpool(lambda: [store.delete(key) for key in unused])
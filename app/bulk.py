@@ -0,0 +1,32 @@
+from typing import Any, List, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+
+MAX_BULK_ITEMS = 1000
+
+
+def validate_items(items: List[Any], schema: Type[BaseModel]) -> tuple[list[tuple[int, BaseModel]], list[dict]]:
+    """
+    Validate every item on its own so one bad entry doesn't fail the batch.
+    Returns the (index, model) pairs that passed and a result entry for each that didn't.
+    """
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_ITEMS} items per request")
+
+    valid, failed = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise TypeError("item must be an object")
+            valid.append((index, schema(**item)))
+        except TypeError as e:
+            failed.append({"index": index, "status": status.HTTP_422_UNPROCESSABLE_ENTITY, "errors": [{"msg": str(e)}]})
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_context=False, include_input=False)
+            failed.append({"index": index, "status": status.HTTP_422_UNPROCESSABLE_ENTITY, "errors": errors})
+    return valid, failed
+
+
+def results(*groups: list[dict]) -> dict:
+    return {"results": sorted((result for group in groups for result in group), key=lambda result: result["index"])}
@@ -0,0 +1,185 @@
+"""
+Maintenance commands.
+
+    python -m app.cli migrate-images
+    python -m app.cli generate-thumbnails
+    python -m app.cli check-indexes
+    python -m app.cli rebuild-counters
+    python -m app.cli rebuild-search-index
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import delete, func, select, update
+
+from app import counters, models, search
+from app.blobstore import get_blob_store, referenced
+from app.database import engine, SessionLocal
+from app.thumbnails import render_variants, store_variants
+
+
+def migrate_images(batch_size: int):
+    """Move image bytes stored in `images.image_data` into the blob store, run after `alembic upgrade head`."""
+    store = get_blob_store()
+    moved = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(models.ImageModel.id, models.ImageModel.image_data)
+                .where(models.ImageModel.blob_key.is_(None), func.length(models.ImageModel.image_data) > 0)
+                .order_by(models.ImageModel.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for image_id, image_data in rows:
+                blob_key, size = store.put_bytes(image_data)
+                db.execute(
+                    update(models.ImageModel)
+                    .where(models.ImageModel.id == image_id)
+                    .values(blob_key=blob_key, size=size, image_data=b"")
+                )
+            # commit per batch so a long migration doesn't hold one big transaction
+            db.commit()
+            moved += len(rows)
+            print(f"moved {moved} images")
+    print(f"done, {moved} images moved to the blob store")
+
+
+def generate_thumbnails(missing_only: bool):
+    """(Re)build the thumbnail variants of stored images, in this process."""
+    store = get_blob_store()
+    done = 0
+    with SessionLocal() as db:
+        stmt = select(models.ImageModel.id, models.ImageModel.blob_key).where(models.ImageModel.blob_key.is_not(None))
+        if missing_only:
+            stmt = stmt.where(~select(models.ImageVariant.id).where(models.ImageVariant.image_id == models.ImageModel.id).exists())
+        for image_id, blob_key in db.execute(stmt).all():
+            try:
+                variants = store_variants(render_variants(store.path(blob_key)))
+            except (OSError, ValueError) as e:
+                print(f"skipping image {image_id}: {e}")
+                continue
+            old_keys = set(db.scalars(select(models.ImageVariant.blob_key).where(models.ImageVariant.image_id == image_id)).all())
+            db.execute(delete(models.ImageVariant).where(models.ImageVariant.image_id == image_id))
+            db.add_all(models.ImageVariant(image_id=image_id, **variant) for variant in variants)
+            db.commit()
+            # thumbnails of identical images are shared, only drop the ones nothing points at now
+            if old_keys:
+                for key in old_keys - set(db.scalars(referenced(old_keys)).all()):
+                    store.delete(key)
+            done += 1
+    print(f"done, thumbnails made for {done} images")
+
+
+def hot_queries() -> dict:
+    """The lookups every request makes, with placeholder values."""
+    user_id = row_id = 1
+    todos_of_user = select(models.Todo.id)\
+        .join(models.Project, models.Project.id == models.Todo.project_id)\
+        .where(models.Project.user_id == user_id)
+    return {
+        "projects of a user": select(models.Project).where(models.Project.user_id == user_id),
+        "todos of a project": select(models.Todo).where(models.Todo.project_id == row_id),
+        "resources of a todo": select(models.Resource).where(models.Resource.todo_id == row_id),
+        "todos of a user": todos_of_user,
+        "resources of a user": select(models.Resource.id)
+            .join(models.Todo, models.Todo.id == models.Resource.todo_id)
+            .join(models.Project, models.Project.id == models.Todo.project_id)
+            .where(models.Project.user_id == user_id),
+        "todo ownership": todos_of_user.where(models.Todo.id == row_id),
+        "profile image": select(models.ImageModel.id).where(models.ImageModel.user_id == user_id),
+        "image variant": select(models.ImageVariant.id).where(models.ImageVariant.image_id == row_id),
+        "otp by email and code": select(models.OTPRecord.id)
+            .where(models.OTPRecord.email == "user@example.com", models.OTPRecord.otp == "123456"),
+        "otp by email": select(models.OTPRecord.id).where(models.OTPRecord.email == "user@example.com"),
+        "expired otps": select(models.OTPRecord.id).where(models.OTPRecord.expires_at <= "2026-01-01 00:00:00"),
+        "search postings": select(models.SearchPosting.doc_id)
+            .where(models.SearchPosting.user_id == user_id, models.SearchPosting.term.in_(["idea", "plan"])),
+        "postings of a document": select(models.SearchPosting.term)
+            .where(models.SearchPosting.kind == "todo", models.SearchPosting.doc_id == row_id),
+        "projects waiting to be purged": select(models.Project.id).where(models.Project.user_id.is_(None)),
+        "accounts waiting to be purged": select(models.User.id).where(models.User.deleted_at.is_not(None)),
+    }
+
+
+def _full_scans(conn, stmt) -> list[str]:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        details = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        return [detail for detail in details if detail.startswith("SCAN ") and detail != "SCAN CONSTANT ROW"]
+    if conn.dialect.name == "postgresql":
+        # small tables are cheaper to scan, ask whether an index *can* serve the query
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        scans, nodes = [], [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                scans.append(f"Seq Scan on {node['Relation Name']}")
+            nodes.extend(node.get("Plans", []))
+        return scans
+    raise RuntimeError(f"check-indexes doesn't know how to read {conn.dialect.name} plans")
+
+
+def check_indexes() -> bool:
+    """EXPLAIN the hot queries and report any that fall back to a full table scan."""
+    ok = True
+    with engine.begin() as conn:
+        for name, stmt in hot_queries().items():
+            scans = _full_scans(conn, stmt)
+            print(f"{'FAIL' if scans else 'ok':<5} {name}" + (f": {', '.join(scans)}" if scans else ""))
+            ok = ok and not scans
+    return ok
+
+
+def rebuild_counters(batch_size: int):
+    """Recompute every project's progress counters from the todos and resources tables."""
+    with engine.begin() as conn:
+        rebuilt = counters.rebuild(conn, batch_size)
+    print(f"done, counters rebuilt for {rebuilt} projects")
+
+
+def rebuild_search_index(batch_size: int):
+    """Re-tokenize every project, todo and resource into the search index, in one transaction."""
+    with engine.begin() as conn:
+        indexed = search.rebuild(conn, batch_size)
+    print(f"done, {indexed} documents indexed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="ideamentor maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    images = commands.add_parser("migrate-images", help="move inline profile images into the blob store")
+    images.add_argument("--batch-size", type=int, default=100)
+
+    thumbs = commands.add_parser("generate-thumbnails", help="make thumbnail variants for stored images")
+    thumbs.add_argument("--missing-only", action="store_true", help="skip images that already have variants")
+
+    commands.add_parser("check-indexes", help="fail if a hot query needs a full table scan")
+
+    rebuild = commands.add_parser("rebuild-counters", help="recompute the todo and resource counters of every project")
+    rebuild.add_argument("--batch-size", type=int, default=1000)
+
+    reindex = commands.add_parser("rebuild-search-index", help="rebuild the full-text search index from scratch")
+    reindex.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate-images":
+        migrate_images(args.batch_size)
+    elif args.command == "generate-thumbnails":
+        generate_thumbnails(args.missing_only)
+    elif args.command == "check-indexes":
+        if not check_indexes():
+            sys.exit(1)
+    elif args.command == "rebuild-counters":
+        rebuild_counters(args.batch_size)
+    elif args.command == "rebuild-search-index":
+        rebuild_search_index(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,88 @@ CLIENT_SECRET = os.environ.get("client_secret", None)
 SECRET_KEY = os.environ.get("secret_key", None)
 EMAIL_SENDER = os.environ.get("email_sender", None)
 EMAIL_PASSWORD = os.environ.get("email_password", None)
-OTP_SECRET_KEY = os.environ.get("otp_secret_key", None)
 SQLALCHEMY_DATABASE_URL = os.environ.get("sqlalchemy_database_url", None)
 ALGORITHM = os.environ.get("algorithm", None)
 AUTH_SECRET = os.environ.get("auth_secret_key", None)
 SQLALCHEMY_DATABASE_URL = os.environ.get("SQLALCHEMY_DATABASE_URL", None)
+ASYNC_SQLALCHEMY_DATABASE_URL = os.environ.get("ASYNC_SQLALCHEMY_DATABASE_URL", None)
+
+# password hashing pool, "thread" or "process"
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# requests allowed to wait for a worker before new ones get a 503, 0 means unbounded
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 0))
+
+# outbound mail, point SMTP_HOST/SMTP_PORT at a local stand-in with SMTP_USE_TLS=false for testing
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 465))
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() == "true"
+MAIL_CONNECTIONS = int(os.environ.get("MAIL_CONNECTIONS", 1))
+MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 20))
+MAIL_QUEUE_SIZE = int(os.environ.get("MAIL_QUEUE_SIZE", 1000))
+MAIL_MAX_RETRIES = int(os.environ.get("MAIL_MAX_RETRIES", 5))
+MAIL_RETRY_BACKOFF = float(os.environ.get("MAIL_RETRY_BACKOFF", 1.0))
+# seconds a connection may sit unused before it is closed
+MAIL_IDLE_TIMEOUT = float(os.environ.get("MAIL_IDLE_TIMEOUT", 60))
+
+# profile image storage
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_PATH = os.environ.get("BLOB_STORE_PATH", "blobs")
+MAX_IMAGE_SIZE = int(os.environ.get("MAX_IMAGE_SIZE", 5 * 1024 * 1024))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 1))
+
+# verified access tokens kept in memory, 0 turns the cache off
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+
+# owner lookups of projects, todos and resources; entries are per process so keep the ttl short
+OWNERSHIP_CACHE_SIZE = int(os.environ.get("OWNERSHIP_CACHE_SIZE", 50000))
+OWNERSHIP_CACHE_TTL = float(os.environ.get("OWNERSHIP_CACHE_TTL", 60))
+
+# sign-up verification codes, "sql" or "memory" (single process only, for tests)
+OTP_STORE_BACKEND = os.environ.get("OTP_STORE_BACKEND", "sql")
+OTP_TTL = float(os.environ.get("OTP_TTL", 600))
+OTP_LENGTH = int(os.environ.get("OTP_LENGTH", 6))
+# seconds between deletes of expired codes
+OTP_SWEEP_INTERVAL = float(os.environ.get("OTP_SWEEP_INTERVAL", 60))
+
+# rate limits of the bcrypt and mail endpoints, "memory" (per process) or "redis" (shared, needs the redis package)
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_IP_BURST = float(os.environ.get("RATE_LIMIT_IP_BURST", 20))
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get("RATE_LIMIT_IP_PER_MINUTE", 20))
+RATE_LIMIT_ACCOUNT_BURST = float(os.environ.get("RATE_LIMIT_ACCOUNT_BURST", 5))
+RATE_LIMIT_ACCOUNT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_ACCOUNT_PER_MINUTE", 5))
+# expensive requests in flight per process before new ones get a 429
+AUTH_MAX_CONCURRENCY = int(os.environ.get("AUTH_MAX_CONCURRENCY", PASSWORD_HASH_WORKERS * 2))
+
+# bearer token /metrics asks scrapers for, unset leaves it open (keep it off the public network then)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", None)
+
+# connection pools; size, overflow and timeout only apply to queue pools (postgres, sqlite files opened sync)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+# seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+# seconds after which a connection is replaced, keep it below the server's idle timeout, -1 never
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+# test connections on checkout so ones dropped by the server are replaced instead of failing a request
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+# milliseconds a statement may run before the server cancels it, 0 for no limit (postgres and mysql)
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 0))
+
+# optional read replica, GET and HEAD requests read from it
+READ_REPLICA_DATABASE_URL = os.environ.get("READ_REPLICA_DATABASE_URL", None)
+ASYNC_READ_REPLICA_DATABASE_URL = os.environ.get("ASYNC_READ_REPLICA_DATABASE_URL", None)
+
+# deleting a project or account with more todos and resources than this returns 202 and purges in the background
+PURGE_INLINE_MAX_ROWS = int(os.environ.get("PURGE_INLINE_MAX_ROWS", 1000))
+# rows deleted per transaction by the purge, and seconds between transactions so other writers get the locks
+PURGE_CHUNK_SIZE = int(os.environ.get("PURGE_CHUNK_SIZE", 500))
+PURGE_CHUNK_PAUSE = float(os.environ.get("PURGE_CHUNK_PAUSE", 0.01))
+# seconds between checks for purges left by other workers or a restart
+PURGE_INTERVAL = float(os.environ.get("PURGE_INTERVAL", 300))
+
+# python -m app.serve: worker processes forked from one preloaded app, and seconds each gets to finish its requests on SIGTERM
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", os.cpu_count() or 1))
+SERVE_GRACEFUL_TIMEOUT = int(os.environ.get("SERVE_GRACEFUL_TIMEOUT", 30))
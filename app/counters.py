@@ -0,0 +1,71 @@
+"""
+Per-project progress counters (`todo_count`, `completed_todo_count`, `resource_count`).
+
+The routers apply these statements in the same transaction as the write they account for,
+`rebuild` recomputes every project from the todos and resources tables.
+"""
+from sqlalchemy import Connection, bindparam, case, distinct, func, select, update
+from sqlalchemy.sql import ColumnElement
+
+from app import models
+
+
+def adjust(project_id: int | ColumnElement, todos=0, completed=0, resources=0):
+    """UPDATE one project's counters by the given deltas, which may be ints or scalar subqueries."""
+    return update(models.Project).where(models.Project.id == project_id).values(
+        todo_count=models.Project.todo_count + todos,
+        completed_todo_count=models.Project.completed_todo_count + completed,
+        resource_count=models.Project.resource_count + resources,
+    )
+
+
+def completed_count(*criteria) -> ColumnElement:
+    """Number of completed todos matching `criteria`, as a scalar subquery."""
+    return select(func.count(models.Todo.id)).where(models.Todo.completed.is_(True), *criteria).scalar_subquery()
+
+
+def resource_count(todo_id: int) -> ColumnElement:
+    return select(func.count(models.Resource.id)).where(models.Resource.todo_id == todo_id).scalar_subquery()
+
+
+def remove_todo(project_id: int | ColumnElement, todo_id: int):
+    """Counters for deleting a todo, run before the delete: its resources are deleted with it."""
+    return adjust(
+        project_id,
+        todos=-1,
+        completed=-completed_count(models.Todo.id == todo_id),
+        resources=-resource_count(todo_id),
+    )
+
+
+def set_completed(project_id: int | ColumnElement, todo_id: int, completed: bool):
+    """Counters for updating a todo's `completed` flag, run before the update. `project_id` may be a scalar subquery."""
+    return adjust(project_id, completed=int(completed) - completed_count(models.Todo.id == todo_id))
+
+
+def project_totals():
+    """All three counters of every project, one GROUP BY over the todos and resources."""
+    return select(
+        models.Project.id,
+        func.count(distinct(models.Todo.id)).label("todo_count"),
+        func.count(distinct(case((models.Todo.completed.is_(True), models.Todo.id)))).label("completed_todo_count"),
+        func.count(models.Resource.id).label("resource_count"),
+    )\
+        .outerjoin(models.Todo, models.Todo.project_id == models.Project.id)\
+        .outerjoin(models.Resource, models.Resource.todo_id == models.Todo.id)\
+        .group_by(models.Project.id)\
+        .order_by(models.Project.id)
+
+
+def rebuild(conn: Connection, batch_size: int = 1000) -> int:
+    """Overwrite every project's counters with the recomputed totals, returns the number of projects."""
+    rebuilt = 0
+    for rows in conn.execution_options(yield_per=batch_size).execute(project_totals()).partitions():
+        conn.execute(
+            update(models.Project).where(models.Project.id == bindparam("project_id")).values(
+                todo_count=bindparam("todos"), completed_todo_count=bindparam("completed"), resource_count=bindparam("resources"),
+            ),
+            [{"project_id": row.id, "todos": row.todo_count, "completed": row.completed_todo_count, "resources": row.resource_count} for row in rows],
+        )
+        rebuilt += len(rows)
+    return rebuilt
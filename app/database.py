@@ -1,14 +1,149 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 
-from app.config import SQLALCHEMY_DATABASE_URL
+from app import metrics
+from app.config import (
+    SQLALCHEMY_DATABASE_URL, ASYNC_SQLALCHEMY_DATABASE_URL, READ_REPLICA_DATABASE_URL, ASYNC_READ_REPLICA_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT,
+)
 # from .config import SQLALCHEMY_DATABASE_URL
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-                       
-SessionLocal = sessionmaker(bind=engine)
+# async driver used for each backend when no explicit async url is configured
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
 
 
-Base = declarative_base()
\ No newline at end of file
+def async_database_url(url: str) -> str:
+    """Swap the driver of a sync database url for its asyncio counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for '{backend}', set ASYNC_SQLALCHEMY_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+# run on every new connection, there is no statement timeout in sqlite
+STATEMENT_TIMEOUT_SQL = {
+    "postgresql": "SET statement_timeout = {}",
+    "mysql": "SET SESSION max_execution_time = {}",
+}
+
+
+def engine_options(url: str, name: str) -> dict:
+    """Pool settings from the config for an engine on `url`, its checkouts timed for /metrics under `name`."""
+    url = make_url(url)
+    pool_class = url.get_dialect().get_pool_class(url)
+    options = {
+        "poolclass": metrics.timed_pool(pool_class, name),
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    # aiosqlite gets a NullPool, which has no size and rejects the arguments
+    if issubclass(pool_class, QueuePool):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def set_statement_timeout(engine: Engine):
+    sql = STATEMENT_TIMEOUT_SQL.get(engine.dialect.name)
+    if not DB_STATEMENT_TIMEOUT or sql is None:
+        return
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(sql.format(DB_STATEMENT_TIMEOUT))
+        cursor.close()
+
+
+def enforce_foreign_keys(engine: Engine):
+    """SQLite ignores foreign keys, and so the ON DELETE CASCADEs, unless each connection turns them on."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
+
+def make_engines(url: str, async_url: str | None, name: str) -> tuple[Engine, AsyncEngine]:
+    """The sync and async engine of one database, `name` labels them in /metrics."""
+    async_url = async_url or async_database_url(url)
+    sync_engine = create_engine(url, **engine_options(url, name))
+    async_engine = create_async_engine(async_url, **engine_options(async_url, f"{name}_async"))
+    for each, label in ((sync_engine, name), (async_engine.sync_engine, f"{name}_async")):
+        set_statement_timeout(each)
+        enforce_foreign_keys(each)
+        metrics.instrument_engine(each, label)
+    return sync_engine, async_engine
+
+
+engine, async_engine = make_engines(SQLALCHEMY_DATABASE_URL, ASYNC_SQLALCHEMY_DATABASE_URL, "primary")
+
+# without a replica every session uses the primary
+replica_engine, async_replica_engine = engine, async_engine
+if READ_REPLICA_DATABASE_URL:
+    replica_engine, async_replica_engine = make_engines(READ_REPLICA_DATABASE_URL, ASYNC_READ_REPLICA_DATABASE_URL, "replica")
+
+
+def dispose_after_fork():
+    """
+    Forget the pooled connections inherited from the parent process, run first thing in a forked child.
+    They are dropped without being closed, the parent still owns those sockets, and the pools start empty.
+    """
+    for each in {engine, replica_engine, async_engine.sync_engine, async_replica_engine.sync_engine}:
+        each.dispose(close=False)
+
+
+async def connect_async_engines():
+    """
+    Open and close one connection per async engine, before any task uses them. The first
+    connection runs the dialect's initialization under a thread lock, and with a NullPool
+    a second task connecting meanwhile blocks the event loop on that lock for good.
+    """
+    for each in {async_engine, async_replica_engine}:
+        async with each.connect():
+            pass
+
+
+class RoutingSession(Session):
+    """
+    A session opened with `info={"read_only": True}` runs its queries on `replica`,
+    everything else runs on the primary it is bound to. Once such a session writes it
+    stays on the primary for the rest of its life, so it reads back what it wrote.
+    """
+
+    replica: Engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("read_only"):
+            if not self._flushing and not getattr(clause, "is_dml", False):
+                return self.replica
+            self.info["read_only"] = False
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+class SyncRoutingSession(RoutingSession):
+    replica = replica_engine
+
+
+class AsyncRoutingSession(RoutingSession):
+    replica = async_replica_engine.sync_engine
+
+
+SessionLocal = sessionmaker(bind=engine, class_=SyncRoutingSession)
+
+# objects stay usable after commit, an expired attribute would need a lazy load which async sessions can't do
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, sync_session_class=AsyncRoutingSession, expire_on_commit=False)
+
+
+Base = declarative_base()
@@ -1,13 +1,24 @@
 from sqlalchemy.orm import Session  # Import Session class
-from app.database import SessionLocal
-from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import SessionLocal, AsyncSessionLocal
+from fastapi import Depends, Request
 from typing import Annotated
 
-def get_db():
-    db = SessionLocal()
+# requests with these methods only read, their sessions use the read replica when one is configured
+READ_ONLY_METHODS = {"GET", "HEAD"}
+
+def get_db(request: Request):
+    db = SessionLocal(info={"read_only": request.method in READ_ONLY_METHODS})
     try:
         yield db
     finally:
         db.close() 
 
 db_dependency = Annotated[Session, Depends(get_db)]  # Use Session class here
+
+
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal(info={"read_only": request.method in READ_ONLY_METHODS}) as db:
+        yield db
+
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
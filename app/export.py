@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import select
+
+from app import models
+from app.database import AsyncSessionLocal
+
+# rows fetched from the server-side cursor at a time
+EXPORT_BATCH_SIZE = 500
+
+PROJECT_FIELDS = ("id", "title", "brief_description", "detailed_description", "created_date", "status")
+TODO_FIELDS = ("id", "task_title", "task_description", "completed")
+RESOURCE_FIELDS = ("id", "resource_title", "resource_description", "link", "resource_type")
+
+
+def _columns(model, prefix, fields):
+    return [getattr(model, field).label(f"{prefix}_{field}") for field in fields]
+
+
+def _pick(row, prefix, fields) -> dict:
+    return {field: row[f"{prefix}_{field}"] for field in fields}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(project: dict) -> bytes:
+    return json.dumps(project, default=_default).encode() + b"\n"
+
+
+async def project_tree_ndjson(user_id: int) -> AsyncIterator[bytes]:
+    """
+    Yield one JSON line per project of the user, with its todos and their resources nested.
+
+    The tree comes from a single project -> todo -> resource outer join ordered by ids,
+    read through a server-side cursor and folded back together row by row, so only
+    the project being written is held in memory.
+    """
+    stmt = select(
+        *_columns(models.Project, "project", PROJECT_FIELDS),
+        *_columns(models.Todo, "todo", TODO_FIELDS),
+        *_columns(models.Resource, "resource", RESOURCE_FIELDS),
+    ).select_from(models.Project)\
+        .outerjoin(models.Todo, models.Todo.project_id == models.Project.id)\
+        .outerjoin(models.Resource, models.Resource.todo_id == models.Todo.id)\
+        .where(models.Project.user_id == user_id)\
+        .order_by(models.Project.id, models.Todo.id, models.Resource.id)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    # the response outlives the request's dependencies, so the stream owns its session
+    async with AsyncSessionLocal(info={"read_only": True}) as db:
+        result = await db.stream(stmt)
+        project = todo = None
+        async for row in result.mappings():
+            if project is None or project["id"] != row["project_id"]:
+                if project is not None:
+                    yield _line(project)
+                project = {**_pick(row, "project", PROJECT_FIELDS), "todos": []}
+                todo = None
+            if row["todo_id"] is not None and (todo is None or todo["id"] != row["todo_id"]):
+                todo = {**_pick(row, "todo", TODO_FIELDS), "resources": []}
+                project["todos"].append(todo)
+            if row["resource_id"] is not None:
+                todo["resources"].append(_pick(row, "resource", RESOURCE_FIELDS))
+        if project is not None:
+            yield _line(project)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from email.message import EmailMessage
+
+import aiosmtplib
+
+from app.config import (
+    EMAIL_SENDER, EMAIL_PASSWORD, SMTP_HOST, SMTP_PORT, SMTP_USE_TLS, MAIL_CONNECTIONS, MAIL_BATCH_SIZE,
+    MAIL_QUEUE_SIZE, MAIL_MAX_RETRIES, MAIL_RETRY_BACKOFF, MAIL_IDLE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    """
+    Background delivery of outgoing mail.
+
+    Requests only enqueue a message and return. A fixed number of workers each
+    keep one SMTP connection open, drain the queue in batches over it and
+    reconnect when the server drops them. Failed sends are retried with
+    exponential backoff, 5xx responses are dropped as permanent failures.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str | None = None, password: str | None = None,
+                 use_tls: bool = True, connections: int = 1, batch_size: int = 20, maxsize: int = 1000,
+                 max_retries: int = 5, retry_backoff: float = 1.0, idle_timeout: float = 60):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.connections = connections
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._retries: set[asyncio.TimerHandle] = set()
+        # metrics
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.started:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._worker(), name=f"mail-worker-{i}") for i in range(self.connections)]
+
+    async def stop(self, timeout: float = 10):
+        """Give queued mail `timeout` seconds to go out, then close the connections."""
+        if not self.started:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("mail queue stopped with %d unsent messages", self._queue.qsize())
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, message: EmailMessage):
+        """Queue a message for delivery, raises asyncio.QueueFull when the queue is at capacity."""
+        self.start()
+        self._queue.put_nowait((message, 0))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "retry_pending": len(self._retries),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, use_tls=self.use_tls)
+        await smtp.connect()
+        if self.username:
+            try:
+                await smtp.login(self.username, self.password)
+            except BaseException:
+                # the caller never sees this connection, so it can't close it
+                await self._close(smtp)
+                raise
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP | None):
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+    async def _next_batch(self) -> list[tuple[EmailMessage, int]]:
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _retry_later(self, message: EmailMessage, attempt: int):
+        if attempt >= self.max_retries:
+            self.failed += 1
+            logger.error("giving up on mail to %s after %d attempts", message["to"], attempt + 1)
+            return
+        self.retried += 1
+        delay = self.retry_backoff * 2 ** attempt
+
+        def requeue():
+            self._retries.discard(handle)
+            try:
+                self._queue.put_nowait((message, attempt + 1))
+            except asyncio.QueueFull:
+                self.failed += 1
+                logger.error("dropping retry of mail to %s, queue is full", message["to"])
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
+
+    async def _worker(self):
+        smtp = None
+        try:
+            while True:
+                try:
+                    batch = await asyncio.wait_for(self._next_batch(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # nothing to send, don't hold the server's connection slot
+                    await self._close(smtp)
+                    smtp = None
+                    continue
+
+                for message, attempt in batch:
+                    try:
+                        if smtp is None or not smtp.is_connected:
+                            smtp = await self._connect()
+                        await smtp.send_message(message)
+                        self.sent += 1
+                    except aiosmtplib.SMTPResponseException as e:
+                        if e.code >= 500:
+                            self.failed += 1
+                            logger.error("mail to %s rejected: %s %s", message["to"], e.code, e.message)
+                        else:
+                            self._retry_later(message, attempt)
+                    except (aiosmtplib.SMTPException, OSError) as e:
+                        logger.warning("mail to %s failed, reconnecting: %s", message["to"], e)
+                        await self._close(smtp)
+                        smtp = None
+                        self._retry_later(message, attempt)
+                    finally:
+                        self._queue.task_done()
+        finally:
+            await self._close(smtp)
+
+
+mail_queue = MailQueue(
+    SMTP_HOST, SMTP_PORT, EMAIL_SENDER, EMAIL_PASSWORD, use_tls=SMTP_USE_TLS, connections=MAIL_CONNECTIONS,
+    batch_size=MAIL_BATCH_SIZE, maxsize=MAIL_QUEUE_SIZE, max_retries=MAIL_MAX_RETRIES,
+    retry_backoff=MAIL_RETRY_BACKOFF, idle_timeout=MAIL_IDLE_TIMEOUT,
+)
@@ -1,7 +1,14 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from . import models
-from app.database import engine
-from app.routers import auth,projects,todos,users,resources,profile,google_auth
+from app.routers import auth,projects,todos,users,resources,profile,google_auth,search,metrics
+from app.hashing import password_hasher
+from app.mailer import mail_queue
+from app.otp_store import get_otp_store
+from app.purge import purger
+from app import thumbnails
+from app.database import connect_async_engines
+from app.metrics import MetricsMiddleware, register_stats
+from app.ratelimit import auth_concurrency
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -32,14 +39,33 @@ You can **GRUD todo**. for specific project
 
 You can **GRUD resources**. for specific task
 .
+
+## search
+
+You can **search** the titles and descriptions of your projects, todos and resources.
 """
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background workers start with the first event loop and stop before it closes, importing the app does neither."""
+    await connect_async_engines()
+    mail_queue.start()
+    get_otp_store().start()
+    purger.start()
+    yield
+    await mail_queue.stop()
+    await get_otp_store().stop()
+    await purger.stop()
+    password_hasher.shutdown()
+    thumbnails.shutdown()
+
+
 app = FastAPI(
     title="ideamentor",
     description=description,
     summary="this an app used to manage your project ideas.",
     version="0.0.1",
-   
+    lifespan=lifespan,
 )
 origins = [
     "http://localhost",
@@ -59,7 +85,8 @@ app.add_middleware(
     secret_key=os.environ.get("AUTH_SECRET")
 )
 
-models.Base.metadata.create_all(bind=engine)
+# added last so it wraps the other middleware and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(google_auth.router)
@@ -68,5 +95,10 @@ app.include_router(projects.router)
 app.include_router(todos.router)
 app.include_router(resources.router)
 app.include_router(profile.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
 
-
+register_stats("password_hasher", password_hasher.stats)
+register_stats("mail_queue", mail_queue.stats)
+register_stats("auth_concurrency", auth_concurrency.stats)
+register_stats("purger", purger.stats)
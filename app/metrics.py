@@ -0,0 +1,224 @@
+"""
+Request and database metrics in the Prometheus text format, served at /metrics.
+
+`MetricsMiddleware` times every request by method, route template and status. While
+a request runs, the cursor events of the instrumented engines add each statement and
+its time to that request, so a slow route shows whether the time went to the database
+or to Python (validation, serialization, the endpoint itself). Pools made with
+`timed_pool` record how long every connection checkout waited.
+
+Everything is kept per process, scrape each worker on its own.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Observations by label values, counted into fixed buckets."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [counts per bucket (the last is +Inf), sum]
+        self.series: dict[tuple, list] = {}
+        # sync sessions run in the threadpool, so observations can come from any thread
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self.series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route", "status"),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time a request spent executing SQL statements.",
+    ("method", "route"),
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.",
+    ("method", "route"), STATEMENT_BUCKETS,
+)
+STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "Time of each SQL statement, including those run outside requests.",
+    ("engine",),
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time to get a connection from the pool, waiting for a free one or opening it.",
+    ("pool",),
+)
+
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_DB_STATEMENTS, STATEMENT_SECONDS, POOL_CHECKOUT_SECONDS]
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """Times each HTTP request and records the SQL it ran, labelled by the route template rather than the path."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # routing fills in scope["route"], requests that matched nothing share one label
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_SECONDS.observe(elapsed, method, route, str(status_code))
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method, route)
+            REQUEST_DB_STATEMENTS.observe(stats.statements, method, route)
+
+
+_engines: dict[str, Engine] = {}
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Time every statement `engine` runs and charge it to the current request. Pass `async_engine.sync_engine` for an async engine."""
+    _engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        STATEMENT_SECONDS.observe(elapsed, name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # a failed statement never reaches after_cursor_execute
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+_timed_pools: dict[tuple[type, str], type] = {}
+
+
+def timed_pool(pool_class: type[Pool], name: str) -> type[Pool]:
+    """
+    A subclass of `pool_class` that records the time of every checkout under `name`.
+    A subclass rather than an event because the pool has no event for the start of a
+    checkout, and it survives `engine.dispose()`, which recreates the pool from its class.
+    """
+    key = (pool_class, name)
+    if key not in _timed_pools:
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                return pool_class.connect(self)
+            finally:
+                POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, name)
+
+        _timed_pools[key] = type(f"Timed{pool_class.__name__}", (pool_class,), {"connect": connect})
+    return _timed_pools[key]
+
+
+_stats: dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(prefix: str, stats: Callable[[], dict]):
+    """Export the numeric values of a component's `stats()` as `<prefix>_<key>` gauges."""
+    _stats[prefix] = stats
+
+
+def _gauges() -> list[str]:
+    lines = []
+    # only queue pools have a size, a NullPool opens a connection for every checkout
+    for metric, method in (("checked_out", "checkedout"), ("size", "size")):
+        pools = [(name, engine.pool) for name, engine in _engines.items() if hasattr(engine.pool, method)]
+        if pools:
+            lines.append(f"# TYPE db_pool_{metric} gauge")
+            lines.extend(f'db_pool_{metric}{{pool="{_escape(name)}"}} {getattr(pool, method)()}' for name, pool in pools)
+    for prefix, stats in _stats.items():
+        for key, value in stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(_gauges())
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-from sqlalchemy import  Column, Integer, String, Text, DateTime, Boolean, ForeignKey,LargeBinary
+from sqlalchemy import  Column, Integer, String, Text, DateTime, Boolean, ForeignKey,LargeBinary, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -16,9 +16,14 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=False)
+    # bumped by every project, todo and resource write, see app/versions.py
+    data_version = Column(Integer, nullable=False, default=0, server_default='0')
+    # set when the account is deleted, until app/purge.py has removed its data
+    deleted_at = Column(DateTime(timezone=True), index=True)
     
-    projects = relationship('Project', back_populates='user')
-    images = relationship('ImageModel', back_populates='user')
+    # children are deleted by the database's ON DELETE CASCADE, not loaded and deleted one by one
+    projects = relationship('Project', back_populates='user', cascade='all, delete', passive_deletes=True)
+    images = relationship('ImageModel', back_populates='user', cascade='all, delete', passive_deletes=True)
 
 
 class OTPRecord(Base):
@@ -28,6 +33,10 @@ class OTPRecord(Base):
     email = Column(String, nullable=False)
     otp = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    # codes are looked up by (email, code), see app/otp_store.py
+    __table_args__ = (Index('ix_otp_records_email_otp', 'email', 'otp'),)
 
 class Project(Base):
     __tablename__ = 'projects'
@@ -39,11 +48,16 @@ class Project(Base):
     detailed_description = Column(Text)
     created_date = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default='pending')
+    # progress counters kept up to date by the todo and resource routers, see app/counters.py
+    todo_count = Column(Integer, nullable=False, default=0, server_default='0')
+    completed_todo_count = Column(Integer, nullable=False, default=0, server_default='0')
+    resource_count = Column(Integer, nullable=False, default=0, server_default='0')
     
-    user_id = Column(Integer, ForeignKey('users.id'))
+    # NULL while a deleted project waits for app/purge.py
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
     user = relationship('User', back_populates='projects')
     
-    todos = relationship('Todo', back_populates='project')
+    todos = relationship('Todo', back_populates='project', cascade='all, delete', passive_deletes=True)
 
 
 class Todo(Base):
@@ -54,10 +68,10 @@ class Todo(Base):
     task_description = Column(Text)
     completed = Column(Boolean, default=False)
     
-    project_id = Column(Integer, ForeignKey('projects.id'))
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), index=True)
     project = relationship('Project', back_populates='todos')
     
-    resources = relationship('Resource', back_populates='todo')
+    resources = relationship('Resource', back_populates='todo', cascade='all, delete', passive_deletes=True)
 
 
 class Resource(Base):
@@ -69,10 +83,24 @@ class Resource(Base):
     link = Column(String)
     resource_type = Column(String)
     
-    todo_id = Column(Integer, ForeignKey('todos.id'))
+    todo_id = Column(Integer, ForeignKey('todos.id', ondelete='CASCADE'), index=True)
     todo = relationship('Todo', back_populates='resources')
 
 
+class SearchPosting(Base):
+    """One term of one project, todo or resource, see app/search.py."""
+    __tablename__ = 'search_postings'
+
+    # primary key order serves the lookup: a user's postings for a term
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    term = Column(String(64), primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    doc_id = Column(Integer, primary_key=True)
+    weight = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_search_postings_kind_doc_id', 'kind', 'doc_id'),)
+
+
 
 
 
@@ -86,9 +114,28 @@ class ImageModel(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     mimetype = Column(String)
-    image_data = Column(LargeBinary, nullable=False)
+    # legacy inline contents, new images live in the blob store and leave this empty
+    image_data = Column(LargeBinary, nullable=False, default=b"")
+    blob_key = Column(String(64))
+    size = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # New fields for the relationship with User
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
     user = relationship('User', back_populates='images')
+
+    variants = relationship('ImageVariant', back_populates='image', cascade='all, delete', passive_deletes=True)
+
+
+class ImageVariant(Base):
+    __tablename__ = 'image_variants'
+
+    id = Column(Integer, primary_key=True)
+    size = Column(String, nullable=False)
+    mimetype = Column(String, nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+    blob_key = Column(String(64), nullable=False)
+
+    image_id = Column(Integer, ForeignKey('images.id', ondelete='CASCADE'), index=True)
+    image = relationship('ImageModel', back_populates='variants')
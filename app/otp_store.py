@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import secrets
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+
+from app import models
+from app.config import OTP_STORE_BACKEND, OTP_TTL, OTP_LENGTH, OTP_SWEEP_INTERVAL
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def generate_code(length: int) -> str:
+    """A uniformly random numeric code, drawn for each request from the system CSPRNG."""
+    return f"{secrets.randbelow(10 ** length):0{length}d}"
+
+
+class OTPStore(ABC):
+    """
+    One-time codes keyed by (email, code) that expire `ttl` seconds after they are issued.
+
+    Issuing a code replaces the earlier ones for that email, consuming one is atomic
+    so a code works once. Expired codes never verify; `sweep` deletes them and
+    `start` runs it every `sweep_interval` seconds in the background.
+    """
+
+    def __init__(self, ttl: float = 600, length: int = 6, sweep_interval: float = 60):
+        self.ttl = ttl
+        self.length = length
+        self.sweep_interval = sweep_interval
+        self._sweeper: asyncio.Task | None = None
+
+    @abstractmethod
+    async def issue(self, email: str) -> str:
+        ...
+
+    @abstractmethod
+    async def consume(self, email: str, code: str) -> bool:
+        """True when `code` is the current unexpired code for `email`, which it then invalidates."""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Delete expired codes, returns how many."""
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(), name="otp-sweeper")
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                swept = await self.sweep()
+                if swept:
+                    logger.info("swept %d expired one-time codes", swept)
+            except Exception:
+                logger.exception("sweeping expired one-time codes failed")
+
+
+class SQLOTPStore(OTPStore):
+    """Codes in `otp_records`, looked up through the (email, otp) index."""
+
+    async def issue(self, email: str) -> str:
+        code = generate_code(self.length)
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.OTPRecord).where(models.OTPRecord.email == email))
+            db.add(models.OTPRecord(email=email, otp=code, expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl)))
+            await db.commit()
+        return code
+
+    async def consume(self, email: str, code: str) -> bool:
+        async with AsyncSessionLocal() as db:
+            # the DELETE is both the lookup and the invalidation, two concurrent attempts can't both win
+            consumed = await db.scalar(
+                delete(models.OTPRecord)
+                .where(models.OTPRecord.email == email, models.OTPRecord.otp == code,
+                       models.OTPRecord.expires_at > datetime.now(timezone.utc))
+                .returning(models.OTPRecord.id)
+            )
+            await db.commit()
+        return consumed is not None
+
+    async def sweep(self) -> int:
+        async with AsyncSessionLocal() as db:
+            swept = await db.execute(delete(models.OTPRecord).where(models.OTPRecord.expires_at <= datetime.now(timezone.utc)))
+            await db.commit()
+        return swept.rowcount
+
+
+class MemoryOTPStore(OTPStore):
+    """Codes in a dict, for tests and single-process development."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.codes: dict[str, tuple[str, float]] = {}
+
+    async def issue(self, email: str) -> str:
+        code = generate_code(self.length)
+        self.codes[email] = (code, time.monotonic() + self.ttl)
+        return code
+
+    async def consume(self, email: str, code: str) -> bool:
+        current = self.codes.get(email)
+        if current is None or current[1] <= time.monotonic():
+            return False
+        if not secrets.compare_digest(current[0], code):
+            return False
+        del self.codes[email]
+        return True
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [email for email, (_, expires_at) in self.codes.items() if expires_at <= now]
+        for email in expired:
+            del self.codes[email]
+        return len(expired)
+
+
+OTP_STORES = {
+    "sql": SQLOTPStore,
+    "memory": MemoryOTPStore,
+}
+
+_otp_store: OTPStore | None = None
+
+
+def get_otp_store() -> OTPStore:
+    global _otp_store
+    if _otp_store is None:
+        if OTP_STORE_BACKEND not in OTP_STORES:
+            raise RuntimeError(f"unknown otp store backend '{OTP_STORE_BACKEND}'")
+        _otp_store = OTP_STORES[OTP_STORE_BACKEND](ttl=OTP_TTL, length=OTP_LENGTH, sweep_interval=OTP_SWEEP_INTERVAL)
+    return _otp_store
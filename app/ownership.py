@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import OWNERSHIP_CACHE_SIZE, OWNERSHIP_CACHE_TTL
+
+
+class ProjectOwner(NamedTuple):
+    user_id: int
+    project_id: int
+
+
+class TodoOwner(NamedTuple):
+    user_id: int
+    project_id: int
+    todo_id: int
+
+
+class ResourceOwner(NamedTuple):
+    user_id: int
+    project_id: int
+    todo_id: int
+    resource_id: int
+
+
+class _LRU:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[int, tuple[float, tuple]] = OrderedDict()
+
+    def get(self, key: int):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: int, value: tuple):
+        if not self.max_size:
+            return
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: int):
+        self.entries.pop(key, None)
+
+    def drop_where(self, predicate):
+        for key in [key for key, (_, value) in self.entries.items() if predicate(value)]:
+            del self.entries[key]
+
+
+class OwnershipResolver:
+    """
+    Maps project, todo and resource ids to the user that owns them.
+
+    A miss costs one query that joins up to the project, a hit costs none.
+    Ownership never moves, so entries only go stale through deletes (ids can be
+    reused), which is why the delete paths call the forget_* methods. Other
+    workers don't see those calls, so an entry can be wrong for up to the ttl,
+    and no route authorizes with it: reads and writes scope their own statements
+    with `owned_by`, `project_of` and the `locked_*` lookups.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.projects = _LRU(max_size, ttl)
+        self.todos = _LRU(max_size, ttl)
+        self.resources = _LRU(max_size, ttl)
+
+    async def project(self, db: AsyncSession, project_id: int) -> ProjectOwner | None:
+        owner = self.projects.get(project_id)
+        if owner is None:
+            user_id = await db.scalar(select(models.Project.user_id).where(models.Project.id == project_id))
+            if user_id is None:
+                return None
+            owner = ProjectOwner(user_id, project_id)
+            self.projects.put(project_id, owner)
+        return owner
+
+    async def todo(self, db: AsyncSession, todo_id: int) -> TodoOwner | None:
+        owner = self.todos.get(todo_id)
+        if owner is None:
+            row = (await db.execute(
+                select(models.Project.user_id, models.Project.id)
+                .join(models.Todo, models.Todo.project_id == models.Project.id)
+                .where(models.Todo.id == todo_id)
+            )).first()
+            if row is None:
+                return None
+            owner = TodoOwner(row[0], row[1], todo_id)
+            self.todos.put(todo_id, owner)
+        return owner
+
+    async def resource(self, db: AsyncSession, resource_id: int) -> ResourceOwner | None:
+        owner = self.resources.get(resource_id)
+        if owner is None:
+            row = (await db.execute(
+                select(models.Project.user_id, models.Project.id, models.Todo.id)
+                .join(models.Todo, models.Todo.project_id == models.Project.id)
+                .join(models.Resource, models.Resource.todo_id == models.Todo.id)
+                .where(models.Resource.id == resource_id)
+            )).first()
+            if row is None:
+                return None
+            owner = ResourceOwner(row[0], row[1], row[2], resource_id)
+            self.resources.put(resource_id, owner)
+        return owner
+
+    # the create paths know the owner already
+    def remember_project(self, project_id: int, user_id: int):
+        self.projects.put(project_id, ProjectOwner(user_id, project_id))
+
+    def remember_todo(self, todo_id: int, user_id: int, project_id: int):
+        self.todos.put(todo_id, TodoOwner(user_id, project_id, todo_id))
+
+    def remember_resource(self, resource_id: int, user_id: int, project_id: int, todo_id: int):
+        self.resources.put(resource_id, ResourceOwner(user_id, project_id, todo_id, resource_id))
+
+    def forget_resource(self, resource_id: int):
+        self.resources.pop(resource_id)
+
+    def forget_todo(self, todo_id: int):
+        self.todos.pop(todo_id)
+        self.resources.drop_where(lambda owner: owner.todo_id == todo_id)
+
+    def forget_project(self, project_id: int):
+        self.projects.pop(project_id)
+        self.todos.drop_where(lambda owner: owner.project_id == project_id)
+        self.resources.drop_where(lambda owner: owner.project_id == project_id)
+
+    def forget_user(self, user_id: int):
+        for cache in (self.projects, self.todos, self.resources):
+            cache.drop_where(lambda owner: owner.user_id == user_id)
+
+
+ownership = OwnershipResolver(OWNERSHIP_CACHE_SIZE, OWNERSHIP_CACHE_TTL)
+
+
+def owned_by(model, user_id: int) -> ColumnElement:
+    """WHERE clause keeping the projects, todos or resources of `user_id`, for statements that check ownership themselves."""
+    if model is models.Project:
+        return models.Project.user_id == user_id
+    projects = select(models.Project.id).where(models.Project.user_id == user_id)
+    if model is models.Todo:
+        return models.Todo.project_id.in_(projects)
+    if model is models.Resource:
+        return models.Resource.todo_id.in_(select(models.Todo.id).where(models.Todo.project_id.in_(projects)))
+    raise ValueError(f"{model.__name__} has no owner")
+
+
+def update_owned(model, row_id: int, user_id: int, values: dict):
+    """
+    UPDATE one row if `user_id` owns it, RETURNING the whole row. The ownership check is a
+    subquery of the same statement, so nothing is read first and nothing can change in between:
+    no row back means the row doesn't exist or belongs to someone else.
+    """
+    return update(model).where(model.id == row_id, owned_by(model, user_id)).values(values)\
+        .returning(*model.__table__.columns).execution_options(synchronize_session=False)
+
+
+def project_of(model, row_id: int, user_id: int) -> ColumnElement:
+    """Scalar subquery of the project a todo or resource is in, NULL unless `user_id` owns it."""
+    stmt = select(models.Todo.project_id)
+    if model is models.Resource:
+        stmt = stmt.join(models.Resource, models.Resource.todo_id == models.Todo.id)
+    return stmt.where(model.id == row_id, owned_by(model, user_id)).scalar_subquery()
+
+
+async def locked_project(db: AsyncSession, project_id: int, user_id: int) -> ProjectOwner:
+    """
+    Ownership of a project a write is about to add rows to, checked in the database rather
+    than the cache. The row is locked (FOR UPDATE, where the database has it) until the commit,
+    so it can't be deleted between the check and the write.
+    """
+    found = await db.scalar(
+        select(models.Project.id).where(models.Project.id == project_id, owned_by(models.Project, user_id)).with_for_update()
+    )
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    ownership.remember_project(project_id, user_id)
+    return ProjectOwner(user_id, project_id)
+
+
+async def locked_todo(db: AsyncSession, todo_id: int, user_id: int) -> TodoOwner:
+    """Like `locked_project`, for a todo, whose row is the one locked."""
+    project_id = await db.scalar(
+        select(models.Todo.project_id).where(models.Todo.id == todo_id, owned_by(models.Todo, user_id)).with_for_update()
+    )
+    if project_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    ownership.remember_todo(todo_id, user_id, project_id)
+    return TodoOwner(user_id, project_id, todo_id)
@@ -0,0 +1,69 @@
+import base64
+import binascii
+from typing import Annotated, Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        prefix, _, last_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().partition(":")
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+class PageParams:
+    def __init__(self,
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items to return"),
+                 cursor: Optional[str] = Query(None, description="The `next` value of the previous page")):
+        self.limit = limit
+        self.cursor = cursor
+
+
+page_dependency = Annotated[PageParams, Depends()]
+
+
+def _page_of(stmt: Select, id_column, page: PageParams) -> Select:
+    if page.cursor is not None:
+        stmt = stmt.where(id_column > decode_cursor(page.cursor))
+    # one extra row tells us whether there is a next page
+    return stmt.order_by(id_column).limit(page.limit + 1)
+
+
+async def paginate(db: AsyncSession, stmt: Select, id_column, page: PageParams) -> dict:
+    """
+    Keyset pagination on a primary key: the page starts after the id in the cursor,
+    so every page costs an index range scan no matter how deep it is.
+    """
+    rows = (await db.scalars(_page_of(stmt, id_column, page))).all()
+    items = rows[:page.limit]
+    next_cursor = encode_cursor(getattr(items[-1], id_column.key)) if len(rows) > page.limit else None
+    return {"items": items, "next": next_cursor}
+
+
+def select_schema(model, schema: type[BaseModel]) -> Select:
+    """Select just the columns of `model` that `schema` has, labelled with the field names."""
+    return select(*(getattr(model, field).label(field) for field in schema.model_fields))
+
+
+async def paginate_rows(db: AsyncSession, stmt: Select, id_column, page: PageParams) -> dict:
+    """`paginate` for column selects, the items are plain dicts instead of ORM objects."""
+    result = await db.execute(_page_of(stmt, id_column, page))
+    keys = list(result.keys())
+    rows = result.all()
+    items = [dict(zip(keys, row)) for row in rows[:page.limit]]
+    next_cursor = encode_cursor(items[-1][id_column.key]) if len(rows) > page.limit else None
+    return {"items": items, "next": next_cursor}
@@ -0,0 +1,146 @@
+"""
+Deleting projects and accounts too large to delete within a request.
+
+The request only detaches the data: a project loses its owner (`user_id` becomes
+NULL) and an account gets `deleted_at` and loses its projects the same way. Every
+read is scoped by owner, so detached rows vanish at once. The `Purger` then
+deletes them in chunks of `chunk_size` rows, one short transaction per chunk, so
+no statement holds locks on tens of thousands of rows.
+
+Ownerless projects and accounts with `deleted_at` set are the only record of
+pending work, a purge cut short by a restart resumes on the next run.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import blobstore, models
+from app.config import PURGE_INLINE_MAX_ROWS, PURGE_CHUNK_SIZE, PURGE_CHUNK_PAUSE, PURGE_INTERVAL
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def project_rows(db: AsyncSession, criterion) -> int:
+    """Todos and resources of the projects matching `criterion`, from the project counters."""
+    todos, resources = (await db.execute(
+        select(func.sum(models.Project.todo_count), func.sum(models.Project.resource_count)).where(criterion)
+    )).one()
+    return (todos or 0) + (resources or 0)
+
+
+async def is_large(db: AsyncSession, criterion) -> bool:
+    return await project_rows(db, criterion) > PURGE_INLINE_MAX_ROWS
+
+
+def detach_project(project_id: int):
+    return update(models.Project).where(models.Project.id == project_id).values(user_id=None)
+
+
+def detach_user(user_id: int):
+    return update(models.Project).where(models.Project.user_id == user_id).values(user_id=None)
+
+
+class Purger:
+    """Deletes detached projects and accounts chunk by chunk, in a background task woken by `wake`."""
+
+    def __init__(self, chunk_size: int = 500, chunk_pause: float = 0.01, interval: float = 300):
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.interval = interval
+        self.purged_projects = 0
+        self.purged_users = 0
+        self.deleted_rows = 0
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+
+    def start(self):
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            # set so pending work from before a restart is picked up right away
+            self._wakeup.set()
+            self._worker = asyncio.create_task(self._run(), name="purger")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {"purged_projects": self.purged_projects, "purged_users": self.purged_users, "deleted_rows": self.deleted_rows}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.purge_pending()
+            except Exception:
+                logger.exception("purging deleted projects and accounts failed")
+
+    async def purge_pending(self):
+        """Purge every detached project, then every account marked deleted."""
+        while project_id := await self._next(select(models.Project.id).where(models.Project.user_id.is_(None))):
+            await self.purge_project(project_id)
+        while user_id := await self._next(select(models.User.id).where(models.User.deleted_at.is_not(None))):
+            await self.purge_user(user_id)
+
+    async def purge_project(self, project_id: int):
+        todos = select(models.Todo.id).where(models.Todo.project_id == project_id)
+        resources = select(models.Resource.id).where(models.Resource.todo_id.in_(todos))
+        posting = models.SearchPosting
+        await self._delete_chunks(posting, posting.kind == "resource", posting.doc_id.in_(resources))
+        await self._delete_chunks(posting, posting.kind == "todo", posting.doc_id.in_(todos))
+        await self._delete_chunks(models.Resource, models.Resource.todo_id.in_(todos))
+        await self._delete_chunks(models.Todo, models.Todo.project_id == project_id)
+        # the children are gone, so the cascade of the last delete has nothing left to do
+        await self._delete_chunks(posting, posting.kind == "project", posting.doc_id == project_id)
+        await self._delete_chunks(models.Project, models.Project.id == project_id)
+        self.purged_projects += 1
+
+    async def purge_user(self, user_id: int):
+        # projects created with a token issued before the deletion
+        async with AsyncSessionLocal() as db:
+            await db.execute(detach_user(user_id))
+            await db.commit()
+        while project_id := await self._next(select(models.Project.id).where(models.Project.user_id.is_(None))):
+            await self.purge_project(project_id)
+        await self._delete_chunks(models.SearchPosting, models.SearchPosting.user_id == user_id)
+        async with AsyncSessionLocal() as db:
+            image_keys = (await db.scalars(blobstore.image_keys(models.ImageModel.user_id == user_id))).all()
+        # images and their variants go with the account, a handful of rows
+        await self._delete_chunks(models.User, models.User.id == user_id)
+        async with AsyncSessionLocal() as db:
+            await blobstore.release(db, image_keys)
+        self.purged_users += 1
+
+    async def _next(self, stmt) -> int | None:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(stmt.limit(1))
+
+    async def _delete_chunks(self, model, *criteria):
+        """DELETE the rows matching `criteria` `chunk_size` at a time, committing each chunk."""
+        columns = list(model.__table__.primary_key.columns)
+        key = columns[0] if len(columns) == 1 else tuple_(*columns)
+        chunk = select(*columns).where(*criteria).limit(self.chunk_size)
+        while True:
+            async with AsyncSessionLocal() as db:
+                deleted = (await db.execute(delete(model).where(key.in_(chunk)).execution_options(synchronize_session=False))).rowcount
+                await db.commit()
+            self.deleted_rows += deleted
+            if deleted < self.chunk_size:
+                return
+            await asyncio.sleep(self.chunk_pause)
+
+
+purger = Purger(PURGE_CHUNK_SIZE, PURGE_CHUNK_PAUSE, PURGE_INTERVAL)
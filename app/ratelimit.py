@@ -0,0 +1,194 @@
+"""
+Admission control for the endpoints that cost a bcrypt hash or an SMTP send, or that
+check a guessable secret (the emailed codes).
+
+Each guarded request takes a token from a bucket for its client IP and one for the
+account it names, then needs a free slot under a process-wide concurrency cap.
+Any of the three turning it away is a 429 with Retry-After, raised by the route
+dependency before the endpoint does any work.
+
+The client IP is `request.client`, run uvicorn with --proxy-headers behind a proxy.
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Annotated, Callable, NamedTuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app.config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_REDIS_URL, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_MINUTE,
+    RATE_LIMIT_ACCOUNT_BURST, RATE_LIMIT_ACCOUNT_PER_MINUTE, AUTH_MAX_CONCURRENCY,
+)
+
+
+class Limit(NamedTuple):
+    burst: float
+    per_second: float
+
+
+class RateLimitBackend(ABC):
+    """Token buckets by key, `take` returns 0 when a token was taken or the seconds until one is available."""
+
+    @abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        ...
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in a dict, per process. There is no await between reading a bucket and
+    writing it back, so on the event loop every take is atomic without a lock.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.per_second)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / limit.per_second
+        self.buckets[key] = (tokens - 1, now)
+        if len(self.buckets) > self.max_keys:
+            self._evict(now, limit)
+        return 0
+
+    def _evict(self, now: float, limit: Limit):
+        # a bucket idle long enough to have refilled is the same as no bucket
+        refill = limit.burst / limit.per_second
+        for key in [key for key, (_, updated) in self.buckets.items() if now - updated >= refill]:
+            del self.buckets[key]
+        # still full of busy keys: drop the oldest half, insertion order is oldest first
+        if len(self.buckets) > self.max_keys:
+            for key in list(self.buckets)[:len(self.buckets) // 2]:
+                del self.buckets[key]
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker and host, one atomic script call per take. Needs the `redis` package."""
+
+    SCRIPT = """
+    local burst, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens < 1 then wait = (1 - tokens) / rate else tokens = tokens - 1 end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("the redis rate limit backend needs the redis package")
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        return float(await self.script(keys=[f"ratelimit:{key}"], args=[limit.burst, limit.per_second]))
+
+
+class ConcurrencyCap:
+    """A count of in-flight expensive requests, past `max_concurrent` new ones are refused instead of queued."""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_concurrent": self.max_concurrent, "rejected": self.rejected}
+
+
+RATE_LIMIT_BACKENDS = {
+    "memory": lambda: MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS),
+    "redis": lambda: RedisRateLimitBackend(RATE_LIMIT_REDIS_URL),
+}
+
+IP_LIMIT = Limit(RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_MINUTE / 60)
+ACCOUNT_LIMIT = Limit(RATE_LIMIT_ACCOUNT_BURST, RATE_LIMIT_ACCOUNT_PER_MINUTE / 60)
+
+auth_concurrency = ConcurrencyCap(AUTH_MAX_CONCURRENCY)
+
+_backend: RateLimitBackend | None = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    global _backend
+    if _backend is None:
+        if RATE_LIMIT_BACKEND not in RATE_LIMIT_BACKENDS:
+            raise RuntimeError(f"unknown rate limit backend '{RATE_LIMIT_BACKEND}'")
+        _backend = RATE_LIMIT_BACKENDS[RATE_LIMIT_BACKEND]()
+    return _backend
+
+
+def too_many_requests(retry_after: float):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, try again later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+# account keys, each reads the account a request is about from where that endpoint takes it
+async def form_username(request: Request) -> str | None:
+    return (await request.form()).get("username")
+
+
+async def json_email(request: Request) -> str | None:
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body.get("email") if isinstance(body, dict) else None
+
+
+async def query_email(email: str) -> str | None:
+    return email
+
+
+async def no_account() -> None:
+    return None
+
+
+def expensive(scope: str, account_key: Callable = no_account):
+    """
+    Route dependency for a CPU- or SMTP-heavy endpoint: per-IP and per-account token
+    buckets named by `scope`, then a slot under the global cap held until the endpoint is done.
+    """
+    async def admit(request: Request, account: Annotated[str | None, Depends(account_key)]):
+        backend = get_rate_limit_backend()
+        client = request.client.host if request.client else "unknown"
+        wait = await backend.take(f"{scope}:ip:{client}", IP_LIMIT)
+        if not wait and account:
+            wait = await backend.take(f"{scope}:account:{str(account).lower()}", ACCOUNT_LIMIT)
+        if wait:
+            raise too_many_requests(wait)
+        if not auth_concurrency.try_acquire():
+            raise too_many_requests(1)
+        try:
+            yield
+        finally:
+            auth_concurrency.release()
+
+    return Depends(admit)
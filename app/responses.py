@@ -0,0 +1,135 @@
+import os
+import re
+import stat
+from email.utils import formatdate
+from typing import Mapping
+
+import anyio
+import orjson
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True when an If-None-Match header covers `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Turn a single `bytes=` range into inclusive (start, end) offsets.
+
+    Returns None when the header should be ignored (absent, malformed or multiple
+    ranges, which we answer with the full body) and raises ValueError when the
+    range can't be satisfied.
+    """
+    if not range_header:
+        return None
+    match = RANGE_RE.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range, the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(range_header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(range_header)
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """
+    File response with single-range support.
+
+    The body is handed to the server with the ASGI zero-copy send extension when
+    the server offers it, otherwise it is read in chunks like FileResponse.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, range_header: str | None = None, media_type: str | None = None,
+                 headers: Mapping[str, str] | None = None, background: BackgroundTask | None = None):
+        self.path = path
+        self.media_type = media_type
+        self.background = background
+        self.init_headers(headers)
+
+        stat_result = os.stat(path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError(f"{path} is not a file")
+        size = stat_result.st_size
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("last-modified", formatdate(stat_result.st_mtime, usegmt=True))
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            self.status_code = 416
+            self.offset = self.count = 0
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            return
+
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.count = 0, size
+        else:
+            start, end = byte_range
+            self.status_code = 206
+            self.offset, self.count = start, end - start + 1
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self._send_body(scope, send)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_body(self, scope: Scope, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": self.offset,
+                            "count": self.count, "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # the file shrank under us, close the response anyway
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Opt-in fast path for large lists. A route that returns this directly skips the
+    response_model validation, so the content should be plain dicts built from query
+    rows (see `pagination.paginate_rows`), and orjson encodes them.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
@@ -1,23 +1,25 @@
-from fastapi import APIRouter,status,HTTPException,Depends,Request
-from app.database_dependency import db_dependency
+from fastapi import APIRouter,status,HTTPException,Depends,Request,Path,Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database_dependency import async_db_dependency
+from app.hashing import password_hasher
+from app.mailer import mail_queue
+from app.otp_store import get_otp_store
+from app.ratelimit import expensive, form_username, json_email, query_email
+from app.token_cache import token_cache
 import app.schemas as schemas
 import app.models as models
-from passlib.context import CryptContext
 from datetime import timedelta, datetime
 from jose import jwt,JWTError
 from typing import Annotated
 from fastapi.security import OAuth2PasswordBearer,OAuth2PasswordRequestForm
-# google sign in 
-from authlib.integrations.starlette_client import OAuth
 # otp 
 from email.message import EmailMessage
-import ssl
-import smtplib
-import pyotp
+import asyncio
 from datetime import datetime, timedelta
 from datetime import datetime, timedelta, timezone
 # import os
-from app.config import CLIENT_ID,CLIENT_SECRET,SECRET_KEY,ALGORITHM,EMAIL_PASSWORD,EMAIL_SENDER,OTP_SECRET_KEY
+from app.config import CLIENT_ID,CLIENT_SECRET,SECRET_KEY,ALGORITHM,EMAIL_PASSWORD,EMAIL_SENDER
 
 
 
@@ -33,21 +35,20 @@ secret_key = SECRET_KEY
 algorithm =  ALGORITHM
 
 
-bcrypt_context = CryptContext(schemes=['bcrypt'],deprecated = 'auto')
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
 
 # step 1: authenticate user
-def authenticate_user(username_or_email: str, password: str, db: db_dependency):
+async def authenticate_user(username_or_email: str, password: str, db: async_db_dependency):
     # Check if the input is an email or username based on the presence of '@'
     if '@' in username_or_email:
-        user = db.query(models.User).filter(models.User.email == username_or_email).first()
+        user = (await db.scalars(select(models.User).where(models.User.email == username_or_email, models.User.deleted_at.is_(None)))).first()
     else:
-        user = db.query(models.User).filter(models.User.username == username_or_email).first()
+        user = (await db.scalars(select(models.User).where(models.User.username == username_or_email, models.User.deleted_at.is_(None)))).first()
 
     
-    if user and bcrypt_context.verify(password, user.hashed_password):
+    if user and await password_hasher.verify(password, user.hashed_password):
         return user
     return None
 
@@ -74,30 +75,39 @@ def create_access_token(username: str, user_id: int):
 
 # step 3: get current user
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
-    try:
-        payload = jwt.decode(token,secret_key,algorithms=[algorithm])
-        username: str = payload.get('sub')
-        user_id: int = payload.get('id')
-        if username is None or user_id is None:
+    # a token seen before skips the signature check until it expires
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token,secret_key,algorithms=[algorithm])
+        except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="could not validate user")
-        return {"username": username, "id": user_id, }
-    except JWTError:
+        if payload.get('sub') is None or payload.get('id') is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="could not validate user")
+        token_cache.put(token, payload)
+    return {"username": payload['sub'], "id": payload['id'], }
 
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
+
+async def current_account(db: AsyncSession, user_id: int, for_update: bool = False) -> models.User:
+    """
+    The account a token was issued for. Tokens stay valid until they expire, also after their
+    account is deleted, so routes that write under the account (or show it) check it's still
+    there. `for_update` locks the row until the commit, where the database has row locks.
+    """
+    stmt = select(models.User).where(models.User.id == user_id, models.User.deleted_at.is_(None))
+    account = await db.scalar(stmt.with_for_update() if for_update else stmt)
+    if account is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Account no longer exists")
+    return account
+
 '''-------------------------------------------------otp start---with sign up----------------------------------------------------------'''
 
 
 email_sender = EMAIL_SENDER
 email_password = EMAIL_PASSWORD
-otp_secret_key =  OTP_SECRET_KEY
-
-
-def otp_generator():
-    totp = pyotp.TOTP(otp_secret_key)
-    return totp.now()
 
 async def send_verification_email(receiver_email, otp):
     subject = f'{otp} is your ideamentor code'
@@ -115,23 +125,21 @@ async def send_verification_email(receiver_email, otp):
     em['subject'] = subject
     em.set_content(body)
 
-    context = ssl.create_default_context()
+    # delivery happens in the background, the request only waits for the enqueue
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465, context=context) as smtp:
-            smtp.login(email_sender, email_password)
-            smtp.sendmail(email_sender, receiver_email, em.as_string())
-    except smtplib.SMTPException as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
-
-@router.post("/new_user", status_code=status.HTTP_201_CREATED, summary="Create new user account / sign up")
-async def create_new_user(userrequest: schemas.UserRequest, db: db_dependency, otp: int = Depends(otp_generator)):
+        mail_queue.enqueue(em)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to send email: mail queue is full")
+
+@router.post("/new_user", status_code=status.HTTP_201_CREATED, summary="Create new user account / sign up", dependencies=[expensive("signup", json_email)])
+async def create_new_user(userrequest: schemas.UserRequest, db: async_db_dependency):
     '''  ## Sign Up
 
     This endpoint is used for creating a new user account.
     '''
 
     # Check if the user already exists based on email or username
-    existing_user = db.query(models.User).filter((models.User.email == userrequest.email) | (models.User.username == userrequest.username)).first()
+    existing_user = (await db.scalars(select(models.User).where((models.User.email == userrequest.email) | (models.User.username == userrequest.username)))).first()
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already registered with the given email or username")
     
@@ -141,26 +149,23 @@ async def create_new_user(userrequest: schemas.UserRequest, db: db_dependency, o
         lastname=userrequest.lastname,
         email=userrequest.email,
         username=userrequest.username,
-        hashed_password=bcrypt_context.hash(userrequest.password),
+        hashed_password=await password_hasher.hash(userrequest.password),
         is_active=False
     )
     db.add(create_user_model)
-    db.commit()
+    await db.commit()
 
+    # a fresh random code for this email, it expires on its own
+    otp = await get_otp_store().issue(create_user_model.email)
     await send_verification_email(create_user_model.email, otp)
 
-    # Store the OTP and email in your database with an expiration time
-    otp_record = models.OTPRecord(email=userrequest.email, otp=otp)
-    db.add(otp_record)
-    db.commit()
-
     return {"message": "Email sent successfully with OTP!"}
     # except Exception as e:
     #     db.rollback()  # Rollback changes if any exception occurs
     #     # For debugging purposes, you might want to log the exception here
     #     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user and send email")
-@router.post("/resend_otp", status_code=status.HTTP_200_OK, summary="Resend OTP to user's email")
-async def resend_otp(email: str, db: db_dependency):
+@router.post("/resend_otp", status_code=status.HTTP_200_OK, summary="Resend OTP to user's email", dependencies=[expensive("resend_otp", query_email)])
+async def resend_otp(email: str, db: async_db_dependency):
 
     """
     ## resend otp code
@@ -169,35 +174,20 @@ async def resend_otp(email: str, db: db_dependency):
 
 
     # Verify if user email exists in the database
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.scalars(select(models.User).where(models.User.email == email, models.User.deleted_at.is_(None)))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Cancel the previous OTP by deleting or invalidating it
-    previous_otp_record = db.query(models.OTPRecord).filter(models.OTPRecord.email == email).first()
-    if previous_otp_record:
-        db.delete(previous_otp_record)
-        db.commit()
+    # Issuing a new code cancels the previous one
+    new_otp = await get_otp_store().issue(email)
 
-    # Generate a new OTP
-    new_otp = otp_generator()
+    await send_verification_email(email, new_otp)
+    return {"message": "New OTP sent successfully!"}
 
-    # Send the new OTP via email
-    try:
-        await send_verification_email(email, new_otp)
-
-        # Store the new OTP in the database
-        new_otp_record = models.OTPRecord(email=email, otp=new_otp)
-        db.add(new_otp_record)
-        db.commit()
-
-        return {"message": "New OTP sent successfully!"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to resend OTP: {str(e)}")
-
-@router.post("/verify/{code}", summary="Verify that the email used to sign up is yours")
-async def enter_the_code(code: int, db: db_dependency):
+@router.post("/verify/{code}", summary="Verify that the email used to sign up is yours", dependencies=[expensive("verify", query_email)])
+async def enter_the_code(db: async_db_dependency,
+                         code: str = Path(..., pattern=r"^\d+$", description="The code from the email"),
+                         email: str = Query(..., description="The email the code was sent to")):
     """
     ## Verification page
     
@@ -205,35 +195,18 @@ async def enter_the_code(code: int, db: db_dependency):
 
     ** Note: ** otp code is valid around 10 minitues
     """
-    otp_validity_duration = timedelta(minutes=10)
-
-    # Retrieve the stored OTP and timestamp from the database using the code
-    otp_record = db.query(models.OTPRecord).filter(models.OTPRecord.otp == str(code)).first()
-
-    if not otp_record:
-        raise HTTPException(status_code=404, detail="OTP record not found or already used")
-
-    # Make current_time timezone-aware (assuming UTC)
-    current_time = datetime.now(timezone.utc)
-    otp_creation_time = otp_record.created_at
-    otp_expiry_time = otp_creation_time + otp_validity_duration
-
-    if current_time > otp_expiry_time:
-        raise HTTPException(status_code=410, detail="OTP has expired")
-
-    # Use the email from the OTP record to find the corresponding user
-    user = db.query(models.User).filter(models.User.email == otp_record.email).first()
+    # Use the email to find the corresponding user, an account being deleted can't be activated again
+    user = (await db.scalars(select(models.User).where(models.User.email == email, models.User.deleted_at.is_(None)))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    try:
-        user.is_active = True
-        db.delete(otp_record)  # Delete OTP record after successful verification
-        db.commit()
-        return {"message": "Verification successful and user activated"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    # an expired code is gone the same way a used one is
+    if not await get_otp_store().consume(email, code):
+        raise HTTPException(status_code=404, detail="OTP not found, expired or already used")
+
+    user.is_active = True
+    await db.commit()
+    return {"message": "Verification successful and user activated"}
 
 
 
@@ -243,8 +216,8 @@ async def enter_the_code(code: int, db: db_dependency):
 
 # login 
 # Assuming authenticate_user expects parameters like (username_or_email, password, db)
-@router.post("/token", response_model=schemas.TokenResponse, summary="Login endpoint")
-async def login_for_access_token( db: db_dependency, form_data: OAuth2PasswordRequestForm = Depends()
+@router.post("/token", response_model=schemas.TokenResponse, summary="Login endpoint", dependencies=[expensive("login", form_username)])
+async def login_for_access_token( db: async_db_dependency, form_data: OAuth2PasswordRequestForm = Depends()
                                 ):
     '''
     ## Login
@@ -257,7 +230,7 @@ async def login_for_access_token( db: db_dependency, form_data: OAuth2PasswordRe
     # Since OAuth2PasswordRequestForm does not directly provide a 'username' field,
     # we assume 'username' is used here to mean either an actual username or email.
     # So, the form_data.username will contain either the username or the email.
-    user = authenticate_user(username_or_email=form_data.username, password=form_data.password, db=db)
+    user = await authenticate_user(username_or_email=form_data.username, password=form_data.password, db=db)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
@@ -270,7 +243,7 @@ async def login_for_access_token( db: db_dependency, form_data: OAuth2PasswordRe
     return schemas.TokenResponse(access_token=access_token, refresh_token=refresh_token, token_type="bearer")
 
 @router.post("/refresh", summary="Refresh access token")
-async def refresh_token(refresh_token: str, db: db_dependency):
+async def refresh_token(refresh_token: str, db: async_db_dependency):
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -296,9 +269,9 @@ def generate_username(email, first_name, last_name):
     return f"{username_base}_{first_name.lower()}"
 
 
-def get_or_create_user_from_google_data(email, first_name, last_name, db):
+async def get_or_create_user_from_google_data(email, first_name, last_name, db):
     # Check if user already exists based on email
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.scalars(select(models.User).where(models.User.email == email))).first()
 
     if not user:
         # User doesn't exist, create a new one
@@ -318,14 +291,14 @@ def get_or_create_user_from_google_data(email, first_name, last_name, db):
             is_active=True  # Assuming the user should be active upon creation
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     else:
         # Update existing user if needed
         user.firstname = first_name
         user.lastname = last_name
         # Update other fields as necessary
-        db.commit()
+        await db.commit()
 
     return user
 
@@ -1,5 +1,4 @@
 from fastapi import APIRouter, Request
-from authlib.integrations.starlette_client import OAuth
 from fastapi.responses import JSONResponse
 from app.config import CLIENT_ID, CLIENT_SECRET
 
@@ -7,31 +6,39 @@ router = APIRouter(
     tags=['/social auth'],
 )
 
-oauth = OAuth()
+_oauth = None
 
-# Configure Google OAuth2 credentials
-oauth.register(
-    name="google",
-    client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET,
-    authorize_url="https://accounts.google.com/o/oauth2/auth",
-    authorize_params=None,
-    access_token_url="https://oauth2.googleapis.com/token",
-    access_token_params=None,
-    refresh_token_url=None,
-    client_kwargs={"scope": "openid profile email"},
-    server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
-    jwks_uri="https://www.googleapis.com/oauth2/v3/certs",
-)
+
+def google():
+    """The Google OAuth client, authlib (and httpx with it) is imported on the first social login rather than at startup."""
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.starlette_client import OAuth
+        _oauth = OAuth()
+        # Configure Google OAuth2 credentials
+        _oauth.register(
+            name="google",
+            client_id=CLIENT_ID,
+            client_secret=CLIENT_SECRET,
+            authorize_url="https://accounts.google.com/o/oauth2/auth",
+            authorize_params=None,
+            access_token_url="https://oauth2.googleapis.com/token",
+            access_token_params=None,
+            refresh_token_url=None,
+            client_kwargs={"scope": "openid profile email"},
+            server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+            jwks_uri="https://www.googleapis.com/oauth2/v3/certs",
+        )
+    return _oauth.google
 
 @router.get("/login")
 async def login(request: Request):
     redirect_uri = request.url_for("auth")
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await google().authorize_redirect(request, redirect_uri)
 
 
 @router.get("/auth")
 async def auth(request: Request):
-    token = await oauth.google.authorize_access_token(request)
+    token = await google().authorize_access_token(request)
     user = token['userinfo']
     return dict(user)
@@ -0,0 +1,20 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app import metrics
+from app.config import METRICS_TOKEN
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """Request latency, SQL time and pool waits of this process, in the Prometheus text format."""
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
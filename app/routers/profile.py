@@ -1,16 +1,77 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, status, Response
-from app.models import ImageModel
+from fastapi import APIRouter, File, UploadFile, HTTPException, status, Response, Request, BackgroundTasks, Query
+from fastapi.routing import APIRoute
+from starlette.types import Message
+from sqlalchemy import select
+from sqlalchemy.orm import defer
+from typing import Literal
+from app.models import ImageModel, ImageVariant
 from app.schemas import ImageSchema
-from app.database_dependency import db_dependency
-from app.routers.auth import user_dependency
+from app.database_dependency import async_db_dependency
+from app.routers.auth import user_dependency, current_account
+from app.blobstore import get_blob_store, release, BlobTooLarge
+from app.responses import RangeFileResponse, etag_matches
+from app.config import MAX_IMAGE_SIZE
+from app.thumbnails import generate_variants
+
+# room for the multipart boundaries and part headers around the image
+MAX_UPLOAD_BODY = MAX_IMAGE_SIZE + 64 * 1024
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Answers 413 to request bodies over MAX_UPLOAD_BODY before the form parser spools them to disk:
+    from Content-Length when the client sends one, otherwise once the streamed body passes the cap.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image is larger than {MAX_IMAGE_SIZE} bytes")
+            length = request.headers.get("content-length")
+            if length is not None and length.isdigit() and int(length) > MAX_UPLOAD_BODY:
+                raise too_large
+            received = 0
+
+            async def capped_receive() -> Message:
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > MAX_UPLOAD_BODY:
+                    raise too_large
+                return message
+
+            return await handler(Request(request.scope, capped_receive))
+
+        return limited_handler
+
 
 router = APIRouter(
     prefix="/profile",
-    tags=["profile"]
+    tags=["profile"],
+    route_class=UploadLimitRoute,
 )
 
+
+async def store_upload(file: UploadFile) -> tuple[str, int]:
+    """Stream an upload into the blob store, rejecting it once it passes MAX_IMAGE_SIZE."""
+    try:
+        return await get_blob_store().put_upload(file.file, MAX_IMAGE_SIZE)
+    except BlobTooLarge:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image is larger than {MAX_IMAGE_SIZE} bytes")
+
+
+def blob_response(request: Request, blob_key: str, mimetype: str) -> Response:
+    # the content hash is a strong validator, a client holding it never needs the bytes again
+    etag = f'"{blob_key}"'
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return RangeFileResponse(get_blob_store().path(blob_key), request.headers.get("range"), media_type=mimetype, headers=headers)
+
+
 @router.post("/upload/",  summary="Upload user profile image")
-async def upload_image(db: db_dependency, user: user_dependency, file: UploadFile = File(...)):
+async def upload_image(request: Request, db: async_db_dependency, user: user_dependency, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     Upload a profile image for the user.
     The user must be authenticated.
@@ -22,41 +83,60 @@ async def upload_image(db: db_dependency, user: user_dependency, file: UploadFil
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
+    # checked before the upload is stored, locking the account would hold the lock for the whole upload
+    await current_account(db, user.get('id'))
+    blob_key, size = await store_upload(file)
     try:
         img = ImageModel(
             name=file.filename,
             mimetype=file.content_type,
-            image_data=await file.read(),
+            blob_key=blob_key,
+            size=size,
             user_id=user.get('id')
         )
         db.add(img)
-        db.commit()
-        db.refresh(img)
-        return Response(content=img.image_data, media_type=img.mimetype)
+        await db.commit()
+        background_tasks.add_task(generate_variants, img.id)
+        return blob_response(request, img.blob_key, img.mimetype)
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        # the blob went into the store before the row, drop it unless an identical upload uses it
+        await release(db, [blob_key])
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
 
 @router.get("/get_profile", summary="Retrieve user profile image")
-async def get_image(user: user_dependency, db: db_dependency):
+async def get_image(request: Request, user: user_dependency, db: async_db_dependency,
+                    size: Literal["original", "small", "medium", "large"] = Query("original", description="Image size to return")):
     """
     Retrieve the profile image of the authenticated user.
     Returns the image file if found.
+    Supports `If-None-Match` and `Range` requests.
+
+    `small`, `medium` and `large` are square thumbnails made after upload,
+    until they are ready the original is returned.
     """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    image = db.query(ImageModel).filter(ImageModel.user_id == user.get('id')).first()
+    image = (await db.scalars(select(ImageModel).options(defer(ImageModel.image_data)).where(ImageModel.user_id == user.get('id')))).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
-    return Response(content=image.image_data, media_type=image.mimetype)
+    if image.blob_key is None:
+        # not moved to the blob store yet, see `python -m app.cli migrate-images`
+        image_data = await db.scalar(select(ImageModel.image_data).where(ImageModel.id == image.id))
+        return Response(content=image_data, media_type=image.mimetype)
+
+    if size != "original":
+        variant = (await db.scalars(select(ImageVariant).where(ImageVariant.image_id == image.id, ImageVariant.size == size))).first()
+        if variant is not None:
+            return blob_response(request, variant.blob_key, variant.mimetype)
+
+    return blob_response(request, image.blob_key, image.mimetype)
 
 @router.put("/update", summary="Update user profile image")
-async def change_profile(user: user_dependency, db: db_dependency, file: UploadFile = File(...)):
+async def change_profile(user: user_dependency, db: async_db_dependency, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     Update the profile image of the authenticated user.
     The existing image will be replaced with the new one.
@@ -64,16 +144,24 @@ async def change_profile(user: user_dependency, db: db_dependency, file: UploadF
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    db_image = db.query(ImageModel).filter(ImageModel.user_id == user.get("id")).first()
+    db_image = (await db.scalars(select(ImageModel).options(defer(ImageModel.image_data)).where(ImageModel.user_id == user.get("id")))).first()
     if not db_image:
         raise HTTPException(status_code=404, detail="Image not found")
 
+    old_key = db_image.blob_key
+    blob_key, size = await store_upload(file)
     try:
         db_image.name = file.filename
         db_image.mimetype = file.content_type
-        db_image.image_data = await file.read()
-        db.commit()
+        db_image.blob_key = blob_key
+        db_image.size = size
+        db_image.image_data = b""
+        await db.commit()
+        # the old thumbnails are released when generate_variants replaces them
+        await release(db, [old_key])
+        background_tasks.add_task(generate_variants, db_image.id)
         return {"message": "Image updated successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        await release(db, [blob_key])
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,65 +1,131 @@
-from fastapi import APIRouter, HTTPException, status, Path
-from app.database_dependency import db_dependency
-from app import schemas, models
-from app.routers.auth import user_dependency
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database_dependency import async_db_dependency
+from app import schemas, models, purge, search, versions
+from app.routers.auth import user_dependency, current_account
+from app.pagination import page_dependency, paginate, paginate_rows, select_schema
+from app.responses import FastJSONResponse
+from app.export import project_tree_ndjson
+from app.ownership import ownership, update_owned
+from typing import Literal, Optional, Union
 
 router = APIRouter(
     prefix="/project",
     tags=["projects"]
 )
 
-@router.get("/getallprojects", response_model=List[schemas.ProjectResponse], summary="Get all projects of a user")
-async def get_all_projects(db: db_dependency, user: user_dependency):
+# todos and their resources come in two extra SELECT ... IN queries however many projects there are
+project_tree_options = selectinload(models.Project.todos).selectinload(models.Todo.resources)
+
+
+@router.get("/getallprojects", response_model=Union[schemas.Page[schemas.ProjectTree], schemas.Page[schemas.ProjectResponse]], summary="Get all projects of a user", dependencies=[Depends(versions.not_modified)])
+async def get_all_projects(db: async_db_dependency, user: user_dependency, page: page_dependency, response: Response,
+                           include: Optional[Literal["tree"]] = Query(None, description="`tree` nests each project's todos and their resources")):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    if include == "tree":
+        stmt = select(models.Project).where(models.Project.user_id == user.get('id')).options(project_tree_options)
+        result = await paginate(db, stmt, models.Project.id, page)
+        return schemas.Page[schemas.ProjectTree](items=[schemas.ProjectTree.model_validate(p, from_attributes=True) for p in result["items"]], next=result["next"])
+    stmt = select_schema(models.Project, schemas.ProjectResponse).where(models.Project.user_id == user.get('id'))
+    return FastJSONResponse(await paginate_rows(db, stmt, models.Project.id, page), headers=response.headers)
+
+@router.get("/export", response_class=StreamingResponse, summary="Export all projects with their todos and resources")
+async def export_projects(user: user_dependency):
+    """
+    Streams every project of the user as newline-delimited JSON, one project per line
+    with its todos and each todo's resources nested inside.
+    """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    all_projects = db.query(models.Project).filter(models.Project.user_id == user.get('id')).all()
-    return all_projects
+    return StreamingResponse(project_tree_ndjson(user.get('id')), media_type="application/x-ndjson")
 
 @router.get("/get_project/{project_id}/", response_model=schemas.ProjectResponse, summary="Get a project by its ID")
-async def read_project_by_id(user: user_dependency, db: db_dependency, project_id: int = Path(..., gt=0, description="ID of the project")):
+async def read_project_by_id(user: user_dependency, db: async_db_dependency, project_id: int = Path(..., gt=0, description="ID of the project")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    project_model = db.query(models.Project).filter(models.Project.id == project_id, models.Project.user_id == user.get('id')).first()
+    project_model = (await db.scalars(select(models.Project).where(models.Project.id == project_id, models.Project.user_id == user.get('id')))).first()
     if project_model is not None:
         return project_model
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
+@router.get("/{project_id}/full", response_model=schemas.ProjectTree, summary="Get a project with its todos and their resources")
+async def read_project_tree(user: user_dependency, db: async_db_dependency, project_id: int = Path(..., gt=0, description="ID of the project")):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    project_model = (await db.scalars(select(models.Project).where(models.Project.id == project_id, models.Project.user_id == user.get('id')).options(project_tree_options))).first()
+    if project_model is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project_model
+
 @router.post("/new", response_model=schemas.ProjectResponse, status_code=status.HTTP_201_CREATED, summary="Create a new project")
-async def create_new_project(db: db_dependency, user: user_dependency, project_request: schemas.ProjectRequest):
+async def create_new_project(db: async_db_dependency, user: user_dependency, project_request: schemas.ProjectRequest):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    await current_account(db, user.get('id'), for_update=True)
     project_model = models.Project(**project_request.dict(), user_id=user.get('id'))
     db.add(project_model)
-    db.commit()
+    await db.flush()
+    await search.index(db, user.get('id'), "project", {project_model.id: project_model})
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.remember_project(project_model.id, user.get('id'))
     return project_model
 
+async def apply_project_update(db: AsyncSession, user_id: int, project_id: int, values: dict) -> dict:
+    if not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update")
+    project = (await db.execute(update_owned(models.Project, project_id, user_id, values))).mappings().first()
+    if project is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    project = dict(project)
+    if search.is_indexed("project", values):
+        await search.index(db, user_id, "project", {project_id: project})
+    await db.execute(versions.bump(user_id))
+    await db.commit()
+    return project
+
 @router.put('/update/{project_id}', response_model=schemas.ProjectResponse, status_code=status.HTTP_200_OK, summary="Update an existing project")
-async def update_project(db: db_dependency, user: user_dependency, project_request: schemas.ProjectRequest, project_id: int = Path(..., gt=0, description="ID of the project")):
+async def update_project(db: async_db_dependency, user: user_dependency, project_request: schemas.ProjectRequest, project_id: int = Path(..., gt=0, description="ID of the project")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    project_model = db.query(models.Project).filter(models.Project.id == project_id, models.Project.user_id == user.get('id')).first()
-    if project_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    project_model.title = project_request.title
-    project_model.description = project_request.brief_description
-    project_model.priority = project_request.detailed_description
-    db.add(project_model)
-    db.commit()
-    return project_model
+    return await apply_project_update(db, user.get('id'), project_id, project_request.dict())
+
+@router.patch('/update/{project_id}', response_model=schemas.ProjectResponse, status_code=status.HTTP_200_OK, summary="Change some fields of a project")
+async def patch_project(db: async_db_dependency, user: user_dependency, project_patch: schemas.ProjectPatch, project_id: int = Path(..., gt=0, description="ID of the project")):
+    """Only the fields present in the body are written, with one UPDATE that also checks ownership."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    return await apply_project_update(db, user.get('id'), project_id, project_patch.dict(exclude_unset=True))
 
-@router.delete('/delete/{project_id}', summary="Delete a project and its related entities")
-async def delete_project(db: db_dependency, user: user_dependency, project_id: int = Path(..., gt=0, description="ID of the project")):
+@router.delete('/delete/{project_id}', summary="Delete a project and its related entities",
+               responses={status.HTTP_202_ACCEPTED: {"description": "The project is gone from every list and its data is deleted in the background"}})
+async def delete_project(db: async_db_dependency, user: user_dependency, response: Response, project_id: int = Path(..., gt=0, description="ID of the project")):
+    """
+    Delete a project with its todos and resources.
+    A project with more than a thousand or so todos and resources answers 202 instead of 200:
+    it disappears right away and its rows are deleted in the background.
+    """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    project_model = db.query(models.Project).filter(models.Project.id == project_id, models.Project.user_id == user.get('id')).first()
+    project_model = (await db.scalars(select(models.Project).where(models.Project.id == project_id, models.Project.user_id == user.get('id')))).first()
     if project_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    # Deleting todos and resources should be handled transactionally
-    with db.begin():
-        db.query(models.Resource).filter(models.Resource.todo_id.in_(
-            db.query(models.Todo.id).filter(models.Todo.project_id == project_id)
-        )).delete(synchronize_session=False)
-        db.query(models.Todo).filter(models.Todo.project_id == project_id).delete(synchronize_session=False)
-        db.delete(project_model)
+    if await purge.is_large(db, models.Project.id == project_id):
+        await db.execute(purge.detach_project(project_id))
+        await db.execute(versions.bump(user.get('id')))
+        await db.commit()
+        ownership.forget_project(project_id)
+        purge.purger.wake()
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": f"Project {project_id} is being deleted"}
+    # todos and resources go with it through ON DELETE CASCADE
+    await search.unindex_project(db, project_id)
+    await db.delete(project_model)
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.forget_project(project_id)
     return {"message": f"Project {project_id} and all related todos and resources deleted successfully"}
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Path, HTTPException, status
-from app import schemas, models
-from app.database_dependency import db_dependency
+from fastapi import APIRouter, Depends, Path, HTTPException, status, Body, Response
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas, models, counters, search, versions
+from app.database_dependency import async_db_dependency
 from app.routers.auth import user_dependency
-from typing import List
+from app.pagination import page_dependency, paginate_rows, select_schema
+from app.responses import FastJSONResponse
+from app.ownership import ownership, owned_by, update_owned, project_of, locked_todo
+from app.bulk import validate_items, results
+from typing import List, Any
 
 router = APIRouter(
     prefix="/resource",
@@ -11,32 +17,34 @@ router = APIRouter(
 
 @router.get('/allresources',
             status_code=status.HTTP_200_OK,
-            response_model=List[schemas.ResourceResponse],
+            response_model=schemas.Page[schemas.ResourceResponse],
+            dependencies=[Depends(versions.not_modified)],
             summary="Get all resources associated with the user's projects")
-async def get_all_resource(db: db_dependency, user: user_dependency):
+async def get_all_resource(db: async_db_dependency, user: user_dependency, page: page_dependency, response: Response):
     """
     Retrieve all resources related to the projects of the authenticated user.
     """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
     
-    resource_models = db.query(models.Resource)\
-                        .join(models.Todo, models.Resource.todo_id == models.Todo.id)\
-                        .join(models.Project, models.Todo.project_id == models.Project.id)\
-                        .filter(models.Project.user_id == user.get('id'))\
-                        .all()
-
-    if not resource_models:
+    stmt = select_schema(models.Resource, schemas.ResourceResponse)\
+        .join(models.Todo, models.Resource.todo_id == models.Todo.id)\
+        .join(models.Project, models.Todo.project_id == models.Project.id)\
+        .where(models.Project.user_id == user.get('id'))
+    resource_page = await paginate_rows(db, stmt, models.Resource.id, page)
+
+    # an empty page past the end isn't an error, only an empty first page is
+    if not resource_page["items"] and page.cursor is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No resources found for this user")
     
-    return resource_models
+    return FastJSONResponse(resource_page, headers=response.headers)
 
 @router.get('/todos_resources/{todo_id}',
             status_code=status.HTTP_200_OK,
             response_model=List[schemas.ResourceResponse],
             summary="Get resources for a specific todo")
 async def get_project_todos(
-    db: db_dependency,
+    db: async_db_dependency,
     user: user_dependency,
     todo_id: int = Path(..., gt=0, description="ID of the todo that owns this resource")
 ):
@@ -46,27 +54,22 @@ async def get_project_todos(
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    todo = db.query(models.Todo).join(models.Project).filter(
-        models.Todo.id == todo_id, 
-        models.Project.user_id == user.get('id')
-    ).first()
-
-    if not todo:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-
-    resources = db.query(models.Resource).filter(
-        models.Resource.todo_id == todo_id
-    ).all()
+    resources = (await db.execute(select_schema(models.Resource, schemas.ResourceResponse)
+        .join(models.Todo, models.Resource.todo_id == models.Todo.id)
+        .join(models.Project, models.Todo.project_id == models.Project.id)
+        .where(models.Resource.todo_id == todo_id, models.Project.user_id == user.get('id'))
+    )).mappings().all()
 
+    # someone else's todo reads as one without resources
     if not resources:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No resources found")
 
-    return resources
+    return FastJSONResponse([dict(resource) for resource in resources])
 
 @router.post('/new_resource/{todo_id}',
              status_code=status.HTTP_201_CREATED,
              summary="Add a new resource to a todo")
-async def add_resource(db: db_dependency,
+async def add_resource(db: async_db_dependency,
                        user: user_dependency,
                        resource_request: schemas.ResourceRequest,
                        todo_id: int = Path(..., gt=0, description="ID of the todo to which this resource belongs")):
@@ -76,20 +79,108 @@ async def add_resource(db: db_dependency,
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
     
-    todo_model = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
-    if not todo_model or todo_model.project.user_id != user.get('id'):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found or unauthorized access")
+    owner = await locked_todo(db, todo_id, user.get('id'))
 
     resource_model = models.Resource(**resource_request.dict(), todo_id=todo_id)
     db.add(resource_model)
-    db.commit()
+    await db.flush()
+    await db.execute(counters.adjust(owner.project_id, resources=1))
+    await search.index(db, owner.user_id, "resource", {resource_model.id: resource_request})
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.remember_resource(resource_model.id, owner.user_id, owner.project_id, todo_id)
     return {"message": "Resource added successfully"}
 
+@router.post('/bulk/{todo_id}',
+             status_code=status.HTTP_200_OK,
+             response_model=schemas.BulkResponse,
+             summary="Add many resources to a todo")
+async def add_resources_bulk(db: async_db_dependency,
+                             user: user_dependency,
+                             items: List[Any] = Body(..., description="A list of resources, each shaped like ResourceRequest"),
+                             todo_id: int = Path(..., gt=0, description="ID of the todo to which these resources belong")):
+    """
+    Create many resources with one multi-row INSERT in a single transaction.
+    Each item is validated on its own, `results` has one entry per item in request order.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    owner = await locked_todo(db, todo_id, user.get('id'))
+
+    valid, failed = validate_items(items, schemas.ResourceRequest)
+    created = []
+    if valid:
+        # ids come back in the order of the parameters, not whatever order RETURNING produced
+        resource_ids = (await db.scalars(
+            insert(models.Resource).returning(models.Resource.id, sort_by_parameter_order=True),
+            [{**resource.dict(), "todo_id": todo_id} for _, resource in valid],
+        )).all()
+        await db.execute(counters.adjust(owner.project_id, resources=len(valid)))
+        await search.index(db, owner.user_id, "resource", {resource_id: resource for (_, resource), resource_id in zip(valid, resource_ids)})
+        await db.execute(versions.bump(user.get('id')))
+        await db.commit()
+        for (index, _), resource_id in zip(valid, resource_ids):
+            ownership.remember_resource(resource_id, owner.user_id, owner.project_id, todo_id)
+            created.append({"index": index, "status": status.HTTP_201_CREATED, "id": resource_id})
+    return results(created, failed)
+
+@router.put('/bulk_update',
+            status_code=status.HTTP_200_OK,
+            response_model=schemas.BulkResponse,
+            summary="Update many resources")
+async def update_resources_bulk(db: async_db_dependency,
+                                user: user_dependency,
+                                items: List[Any] = Body(..., description="A list of resources, each shaped like ResourceRequest plus its id")):
+    """
+    Update many resources in one transaction, ownership of all of them is checked with one query.
+    `results` has one entry per item in request order.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+
+    valid, failed = validate_items(items, schemas.ResourceBulkUpdate)
+    resource_ids = {resource.id for _, resource in valid}
+    owned = set((await db.scalars(
+        select(models.Resource.id)
+        .join(models.Todo, models.Todo.id == models.Resource.todo_id)
+        .join(models.Project, models.Project.id == models.Todo.project_id)
+        .where(models.Resource.id.in_(resource_ids), models.Project.user_id == user.get('id'))
+    )).all()) if resource_ids else set()
+
+    changes, updated, missing = [], [], []
+    for index, resource in valid:
+        if resource.id in owned:
+            changes.append(resource.dict())
+            updated.append({"index": index, "status": status.HTTP_200_OK, "id": resource.id})
+        else:
+            missing.append({"index": index, "status": status.HTTP_404_NOT_FOUND, "id": resource.id, "errors": [{"msg": "Resource not found"}]})
+    if changes:
+        # bulk UPDATE by primary key, one statement executed for all rows
+        await db.execute(update(models.Resource), changes)
+        await search.index(db, user.get('id'), "resource", {change["id"]: change for change in changes})
+        await db.execute(versions.bump(user.get('id')))
+        await db.commit()
+    return results(updated, missing, failed)
+
+async def apply_resource_update(db: AsyncSession, user_id: int, resource_id: int, values: dict) -> dict:
+    if not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update")
+    resource = (await db.execute(update_owned(models.Resource, resource_id, user_id, values))).mappings().first()
+    if resource is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
+    resource = dict(resource)
+    if search.is_indexed("resource", values):
+        await search.index(db, user_id, "resource", {resource_id: resource})
+    await db.execute(versions.bump(user_id))
+    await db.commit()
+    return resource
+
 @router.put('/update_resource/{resource_id}',
             status_code=status.HTTP_200_OK,
             summary="Update a specific resource")
 async def update_resource(
-    db: db_dependency,
+    db: async_db_dependency,
     user: user_dependency,
     resource_request: schemas.ResourceRequest, 
     resource_id: int = Path(..., gt=0, description="ID of the resource to update")
@@ -100,24 +191,32 @@ async def update_resource(
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    resource_model = db.query(models.Resource)\
-        .join(models.Todo, models.Todo.id == models.Resource.todo_id)\
-        .join(models.Project, models.Project.id == models.Todo.project_id)\
-        .filter(models.Resource.id == resource_id, models.Project.user_id == user.get('id'))\
-        .first()
+    await apply_resource_update(db, user.get('id'), resource_id, resource_request.dict())
+    return {"message": f"Resource with ID {resource_id} updated successfully"}
 
-    if resource_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
+@router.patch('/update_resource/{resource_id}',
+              status_code=status.HTTP_200_OK,
+              response_model=schemas.ResourceResponse,
+              summary="Change some fields of a resource")
+async def patch_resource(
+    db: async_db_dependency,
+    user: user_dependency,
+    resource_patch: schemas.ResourcePatch,
+    resource_id: int = Path(..., gt=0, description="ID of the resource to update")
+):
+    """
+    Change the fields present in the body and return the resource, in one UPDATE that also checks ownership.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    resource_model.update(resource_request.dict())
-    db.commit()
-    return {"message": f"Resource with ID {resource_id} updated successfully"}
+    return await apply_resource_update(db, user.get('id'), resource_id, resource_patch.dict(exclude_unset=True))
 
 @router.delete('/delete_resource/{resource_id}',
                status_code=status.HTTP_200_OK,
                summary="Delete a specific resource")
 async def delete_resource(
-    db: db_dependency,
+    db: async_db_dependency,
     user: user_dependency,
     resource_id: int = Path(..., gt=0, description="ID of the resource to delete")
 ):
@@ -127,15 +226,13 @@ async def delete_resource(
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    resource_model = db.query(models.Resource)\
-        .join(models.Todo, models.Todo.id == models.Resource.todo_id)\
-        .join(models.Project, models.Project.id == models.Todo.project_id)\
-        .filter(models.Resource.id == resource_id, models.Project.user_id == user.get('id'))\
-        .first()
-
-    if resource_model is None:
+    # the counters and the index are only committed if the delete, scoped to the user's resources, found the row
+    await db.execute(counters.adjust(project_of(models.Resource, resource_id, user.get('id')), resources=-1))
+    await search.unindex(db, "resource", [resource_id])
+    deleted = await db.execute(delete(models.Resource).where(models.Resource.id == resource_id, owned_by(models.Resource, user.get('id'))))
+    if not deleted.rowcount:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
-
-    db.delete(resource_model)
-    db.commit()
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.forget_resource(resource_id)
     return {"message": f"Resource with ID {resource_id} deleted successfully"}
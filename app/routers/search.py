@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from app.database_dependency import async_db_dependency
+from app import schemas, search
+from app.routers.auth import user_dependency
+from typing import List, Literal, Optional
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"]
+)
+
+@router.get("", response_model=List[schemas.SearchHit], summary="Search the user's projects, todos and resources")
+async def search_ideas(db: async_db_dependency,
+                       user: user_dependency,
+                       q: str = Query(..., min_length=2, max_length=200, description="Words to look for"),
+                       kind: Optional[List[Literal["project", "todo", "resource"]]] = Query(None, description="Only return these kinds of documents"),
+                       limit: int = Query(20, ge=1, le=100, description="Maximum number of results")):
+    """
+    Ranked full-text search over titles and descriptions, best match first.
+    Documents containing more of the words rank higher, title matches count more than description matches.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    return await search.search(db, user.get('id'), q, limit, kind or search.DOCUMENTS)
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Path, HTTPException, status
-from app import schemas, models
-from app.database_dependency import db_dependency
+from fastapi import APIRouter, Depends, Path, HTTPException, status, Body, Response
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas, models, counters, search, versions
+from app.database_dependency import async_db_dependency
 from app.routers.auth import user_dependency
-from typing import List
+from app.pagination import page_dependency, paginate_rows, select_schema
+from app.responses import FastJSONResponse
+from app.ownership import ownership, owned_by, update_owned, project_of, locked_project
+from app.bulk import validate_items, results
+from typing import List, Any
 
 router = APIRouter(
     prefix="/todos",
@@ -11,90 +17,210 @@ router = APIRouter(
 
 @router.get('/alltodos', 
             status_code=status.HTTP_200_OK, 
-            response_model=List[schemas.TodoResponse], 
+            response_model=schemas.Page[schemas.TodoResponse], 
+            dependencies=[Depends(versions.not_modified)],
             summary="Get all todos for the user")
-async def get_all_todos(db: db_dependency, user: user_dependency):
+async def get_all_todos(db: async_db_dependency, user: user_dependency, page: page_dependency, response: Response):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    todo_models = db.query(models.Todo)\
-                    .join(models.Project, models.Project.id == models.Todo.project_id)\
-                    .filter(models.Project.user_id == user.get('id'))\
-                    .all()
+    stmt = select_schema(models.Todo, schemas.TodoResponse)\
+        .join(models.Project, models.Project.id == models.Todo.project_id)\
+        .where(models.Project.user_id == user.get('id'))
 
-    return todo_models
+    return FastJSONResponse(await paginate_rows(db, stmt, models.Todo.id, page), headers=response.headers)
 
 @router.get('/all_project_todo/{project_id_para}',
             status_code=status.HTTP_200_OK,
-            response_model=List[schemas.TodoResponse],
+            response_model=schemas.Page[schemas.TodoResponse],
             summary="Get all todos for a specific project")
-async def get_project_todos(db: db_dependency,
+async def get_project_todos(db: async_db_dependency,
                             user: user_dependency,
+                            page: page_dependency,
                             project_id_para: int = Path(...,gt=0,description="ID of the project that owns these todos")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    project = db.query(models.Project).filter(models.Project.id == project_id_para, models.Project.user_id == user.get('id')).first()
-    if not project:
+    stmt = select_schema(models.Todo, schemas.TodoResponse)\
+        .join(models.Project, models.Project.id == models.Todo.project_id)\
+        .where(models.Todo.project_id == project_id_para, models.Project.user_id == user.get('id'))
+    todo_page = await paginate_rows(db, stmt, models.Todo.id, page)
+
+    # an empty first page is either an empty project or someone else's, only the second is a 404
+    if not todo_page["items"] and page.cursor is None and await db.scalar(
+        select(models.Project.id).where(models.Project.id == project_id_para, owned_by(models.Project, user.get('id')))
+    ) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
-    todo_models = db.query(models.Todo).filter(models.Todo.project_id == project_id_para).all()
-    return todo_models
+    return FastJSONResponse(todo_page)
 
 @router.post("/new_todo/{project_id_para}",
              status_code=status.HTTP_201_CREATED,
              summary="Create a new todo in a project")
-async def create_new_todo(db: db_dependency, 
+async def create_new_todo(db: async_db_dependency, 
                           user: user_dependency,
                           todo_request: schemas.TodoRequest, 
                           project_id_para: int = Path(..., gt=0, description="ID of the project to create this todo in")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    project = db.query(models.Project).filter(models.Project.id == project_id_para, models.Project.user_id == user.get('id')).first()
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    await locked_project(db, project_id_para, user.get('id'))
 
     todo_model = models.Todo(**todo_request.dict(), project_id=project_id_para)
     db.add(todo_model)
-    db.commit()
+    await db.flush()
+    await db.execute(counters.adjust(project_id_para, todos=1, completed=int(todo_request.completed)))
+    await search.index(db, user.get('id'), "todo", {todo_model.id: todo_request})
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.remember_todo(todo_model.id, user.get('id'), project_id_para)
     return {"message": "Todo added successfully"}
 
+@router.post("/bulk/{project_id_para}",
+             status_code=status.HTTP_200_OK,
+             response_model=schemas.BulkResponse,
+             summary="Create many todos in a project")
+async def create_todos_bulk(db: async_db_dependency,
+                            user: user_dependency,
+                            items: List[Any] = Body(..., description="A list of todos, each shaped like TodoRequest"),
+                            project_id_para: int = Path(..., gt=0, description="ID of the project to create the todos in")):
+    """
+    Create many todos with one multi-row INSERT in a single transaction.
+    Each item is validated on its own, `results` has one entry per item in request order.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    await locked_project(db, project_id_para, user.get('id'))
+
+    valid, failed = validate_items(items, schemas.TodoRequest)
+    created = []
+    if valid:
+        # no database promises RETURNING rows in VALUES order, sort_by_parameter_order makes
+        # SQLAlchemy hand the ids back in the order of the parameters
+        todo_ids = (await db.scalars(
+            insert(models.Todo).returning(models.Todo.id, sort_by_parameter_order=True),
+            [{**todo.dict(), "project_id": project_id_para} for _, todo in valid],
+        )).all()
+        await db.execute(counters.adjust(project_id_para, todos=len(valid), completed=sum(todo.completed for _, todo in valid)))
+        await search.index(db, user.get('id'), "todo", {todo_id: todo for (_, todo), todo_id in zip(valid, todo_ids)})
+        await db.execute(versions.bump(user.get('id')))
+        await db.commit()
+        for (index, _), todo_id in zip(valid, todo_ids):
+            ownership.remember_todo(todo_id, user.get('id'), project_id_para)
+            created.append({"index": index, "status": status.HTTP_201_CREATED, "id": todo_id})
+    return results(created, failed)
+
+@router.put("/bulk_update",
+            status_code=status.HTTP_200_OK,
+            response_model=schemas.BulkResponse,
+            summary="Update many todos")
+async def update_todos_bulk(db: async_db_dependency,
+                            user: user_dependency,
+                            items: List[Any] = Body(..., description="A list of todos, each shaped like TodoRequest plus its id")):
+    """
+    Update many todos in one transaction, ownership of all of them is checked with one query.
+    `results` has one entry per item in request order.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    valid, failed = validate_items(items, schemas.TodoBulkUpdate)
+    todo_ids = {todo.id for _, todo in valid}
+    # id -> (project_id, completed) of the todos the user owns, the current flag feeds the counters
+    owned = {todo_id: (project_id, bool(completed)) for todo_id, project_id, completed in (await db.execute(
+        select(models.Todo.id, models.Todo.project_id, models.Todo.completed)
+        .join(models.Project, models.Project.id == models.Todo.project_id)
+        .where(models.Todo.id.in_(todo_ids), models.Project.user_id == user.get('id'))
+    )).all()} if todo_ids else {}
+
+    changes, updated, missing = [], [], []
+    completed_delta = {}
+    for index, todo in valid:
+        if todo.id in owned:
+            changes.append(todo.dict())
+            project_id, was_completed = owned[todo.id]
+            completed_delta[project_id] = completed_delta.get(project_id, 0) + int(todo.completed) - int(was_completed)
+            # a later item for the same id starts from this one's flag
+            owned[todo.id] = (project_id, todo.completed)
+            updated.append({"index": index, "status": status.HTTP_200_OK, "id": todo.id})
+        else:
+            missing.append({"index": index, "status": status.HTTP_404_NOT_FOUND, "id": todo.id, "errors": [{"msg": "Todo not found"}]})
+    if changes:
+        # bulk UPDATE by primary key, one statement executed for all rows
+        await db.execute(update(models.Todo), changes)
+        for project_id, delta in completed_delta.items():
+            if delta:
+                await db.execute(counters.adjust(project_id, completed=delta))
+        # a repeated id keeps its last item, like the UPDATE does
+        await search.index(db, user.get('id'), "todo", {change["id"]: change for change in changes})
+        await db.execute(versions.bump(user.get('id')))
+        await db.commit()
+    return results(updated, missing, failed)
+
+async def apply_todo_update(db: AsyncSession, user_id: int, todo_id: int, values: dict) -> dict:
+    if not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update")
+    if "completed" in values:
+        # the counters go first, they compare against the current flag; a todo the user
+        # doesn't own has no project here, so the statement changes nothing
+        await db.execute(counters.set_completed(project_of(models.Todo, todo_id, user_id), todo_id, values["completed"]))
+    todo = (await db.execute(update_owned(models.Todo, todo_id, user_id, values))).mappings().first()
+    if todo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    todo = dict(todo)
+    if search.is_indexed("todo", values):
+        await search.index(db, user_id, "todo", {todo_id: todo})
+    await db.execute(versions.bump(user_id))
+    await db.commit()
+    return todo
+
 @router.put('/update/{todo_id}',
             status_code=status.HTTP_200_OK,
             summary="Update a specific todo")
-async def update_todo(db: db_dependency,
+async def update_todo(db: async_db_dependency,
                       user: user_dependency,
                       todo_request: schemas.TodoRequest,
                       todo_id: int = Path(..., gt=0, description="ID of the todo to update")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    todo_model = db.query(models.Todo).join(models.Project).filter(models.Todo.id == todo_id, models.Project.user_id == user.get('id')).first()
-    if todo_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    await apply_todo_update(db, user.get('id'), todo_id, todo_request.dict())
+    return {"message": f"Todo {todo_id} updated successfully"}
 
-    todo_model.task_title = todo_request.task_title
-    todo_model.task_description = todo_request.task_description
-    todo_model.completed = todo_request.completed
+@router.patch('/update/{todo_id}',
+              status_code=status.HTTP_200_OK,
+              response_model=schemas.TodoResponse,
+              summary="Change some fields of a todo")
+async def patch_todo(db: async_db_dependency,
+                     user: user_dependency,
+                     todo_patch: schemas.TodoPatch,
+                     todo_id: int = Path(..., gt=0, description="ID of the todo to update")):
+    """
+    Only the fields present in the body are written, with one UPDATE that also checks ownership.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    db.add(todo_model)
-    db.commit()
-    return {"message": f"Todo {todo_id} updated successfully"}
+    return await apply_todo_update(db, user.get('id'), todo_id, todo_patch.dict(exclude_unset=True))
 
 @router.delete('/delete/{todo_id}',
                status_code=status.HTTP_200_OK,
                summary="Delete a specific todo")
-async def delete_todo(db: db_dependency,
+async def delete_todo(db: async_db_dependency,
                       user: user_dependency,
                       todo_id: int = Path(..., gt=0, description="ID of the todo to delete")):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    todo_model = db.query(models.Todo).join(models.Project).filter(models.Todo.id == todo_id, models.Project.user_id == user.get('id')).first()
-    if todo_model is None:
+    # every statement is scoped to the user's todos, and none of them is committed unless the delete found the todo
+    await db.execute(counters.remove_todo(project_of(models.Todo, todo_id, user.get('id')), todo_id))
+    await search.unindex_todo(db, todo_id)
+    # its resources go with it through ON DELETE CASCADE
+    deleted = await db.execute(delete(models.Todo).where(models.Todo.id == todo_id, owned_by(models.Todo, user.get('id'))))
+    if not deleted.rowcount:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-
-    db.delete(todo_model)
-    db.commit()
+    await db.execute(versions.bump(user.get('id')))
+    await db.commit()
+    ownership.forget_todo(todo_id)
     return {"message": f"Todo with ID {todo_id} deleted successfully"}
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException, status, Path
-from app.database_dependency import db_dependency
-from app.routers.auth import user_dependency, bcrypt_context
-from app import schemas, models
-from typing import List
+from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException, status, Response
+from sqlalchemy import delete, update
+from app.database_dependency import async_db_dependency
+from app.routers.auth import user_dependency, current_account
+from app.ratelimit import expensive
+from app.hashing import password_hasher
+from app.ownership import ownership
+from app import schemas, models, purge, blobstore
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
+
+async def current_user_key(user: user_dependency):
+    return user.get('id') if user else None
+
+
 @router.get("/user_info", response_model=schemas.UserResponse, summary="Get user information")
-async def get_user_info(db: db_dependency, user: user_dependency):
+async def get_user_info(db: async_db_dependency, user: user_dependency):
     """
     Retrieve the information of the authenticated user.
     Returns the user information as a UserResponse object.
@@ -18,11 +27,10 @@ async def get_user_info(db: db_dependency, user: user_dependency):
     """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    user_model = db.query(models.User).filter(models.User.id == user.get('id')).first()
-    return user_model
+    return await current_account(db, user.get('id'))
 
-@router.put('/change_password', status_code=status.HTTP_200_OK, summary="Change user password")
-async def change_password(db: db_dependency, user: user_dependency, user_verify: schemas.UsersVerification):
+@router.put('/change_password', status_code=status.HTTP_200_OK, summary="Change user password", dependencies=[expensive("change_password", current_user_key)])
+async def change_password(db: async_db_dependency, user: user_dependency, user_verify: schemas.UsersVerification):
     """
     Allows the user to change their password.
     Requires the current and new password.
@@ -30,32 +38,39 @@ async def change_password(db: db_dependency, user: user_dependency, user_verify:
     """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
-    user_model = db.query(models.User).filter(models.User.id == user.get('id')).first()
-    if not bcrypt_context.verify(user_verify.password, user_model.hashed_password):
+    user_model = await current_account(db, user.get('id'), for_update=True)
+    if not await password_hasher.verify(user_verify.password, user_model.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid current password")
-    user_model.hashed_password = bcrypt_context.hash(user_verify.new_password)
+    user_model.hashed_password = await password_hasher.hash(user_verify.new_password)
     db.add(user_model)
-    db.commit()
+    await db.commit()
     return {"message": "Password changed successfully"}
 
-@router.delete("/delete_account", summary="Delete user account")
-async def delete_account(db: db_dependency, user: user_dependency):
+@router.delete("/delete_account", summary="Delete user account",
+               responses={status.HTTP_202_ACCEPTED: {"description": "The account can no longer sign in and its data is deleted in the background"}})
+async def delete_account(db: async_db_dependency, user: user_dependency, response: Response):
     """
     Delete the authenticated user's account and all related data (projects, todos, resources, profile picture).
+    A large account answers 202 instead of 200: it can't sign in any more and its data is deleted in the background.
     Raises HTTPException for unauthorized access.
     """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
-    # Deleting associated resources, todos, and projects
-    db.query(models.Resource).join(models.Todo).join(models.Project).filter(models.Project.user_id == user.get('id')).delete(synchronize_session=False)
-    db.query(models.Todo).join(models.Project).filter(models.Project.user_id == user.get('id')).delete(synchronize_session=False)
-    db.query(models.Project).filter(models.Project.user_id == user.get('id')).delete(synchronize_session=False)
-
-    # Delete profile picture and user account
-    db.query(models.ImageModel).filter(models.ImageModel.user_id == user.get('id')).delete(synchronize_session=False)
-    db.query(models.User).filter(models.User.id == user.get('id')).delete(synchronize_session=False)
+    if await purge.is_large(db, models.Project.user_id == user.get('id')):
+        await db.execute(update(models.User).where(models.User.id == user.get('id')).values(deleted_at=datetime.now(timezone.utc), is_active=False))
+        await db.execute(purge.detach_user(user.get('id')))
+        await db.commit()
+        ownership.forget_user(user.get('id'))
+        purge.purger.wake()
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "User account is being deleted"}
 
-    db.commit()
+    image_keys = (await db.scalars(blobstore.image_keys(models.ImageModel.user_id == user.get('id')))).all()
+    # projects, todos, resources, search postings and the profile picture go with it through ON DELETE CASCADE
+    await db.execute(delete(models.User).where(models.User.id == user.get('id')))
+    await db.commit()
+    await blobstore.release(db, image_keys)
+    ownership.forget_user(user.get('id'))
     return {"message": "User account and all related data deleted successfully"}
 
@@ -1,7 +1,15 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import Optional, List, Generic, TypeVar
 from datetime import datetime
 
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next: Optional[str] = None
+
+
 class UserRequest(BaseModel):
     email: EmailStr
     firstname: str = Field(min_length=3)
@@ -31,9 +39,20 @@ class ProjectRequest(BaseModel):
     status: str | None = "un_completed"
 
 
+class ProjectPatch(BaseModel):
+    """The fields of a project to change, the ones left out keep their value."""
+    title: str = Field(None, min_length=3, max_length=255)
+    brief_description: str = Field(None, max_length=225)
+    detailed_description: Optional[str] = None
+    status: str | None = None
+
+
 class ProjectResponse(ProjectRequest):
     id:int
     user_id: int
+    todo_count: int = 0
+    completed_todo_count: int = 0
+    resource_count: int = 0
 
 
     class Config:
@@ -46,10 +65,16 @@ class TodoRequest(BaseModel):
     completed:bool = Field(default=False)
 
 
+class TodoPatch(BaseModel):
+    task_title: str = Field(None, min_length=3, max_length=50)
+    task_description: Optional[str] = Field(None, max_length=104)
+    completed: bool = None
+
+
 class TodoResponse(TodoRequest):
     id: int
     task_title: str
-    task_description: str
+    task_description: Optional[str]
     project_id: int
     completed: bool
 
@@ -61,6 +86,13 @@ class ResourceRequest(BaseModel):
     resource_type:str = "web page"
 
 
+class ResourcePatch(BaseModel):
+    resource_title: str = Field(None, min_length=3, max_length=30)
+    resource_description: str = Field(None, min_length=10, max_length=100)
+    link: str = None
+    resource_type: str = None
+
+
 class ResourceResponse(ResourceRequest):
     id: int
     resource_title: str
@@ -70,6 +102,40 @@ class ResourceResponse(ResourceRequest):
     todo_id: int
 
 
+class TodoTree(TodoResponse):
+    resources: List[ResourceResponse]
+
+
+class ProjectTree(ProjectResponse):
+    todos: List[TodoTree]
+
+
+class TodoBulkUpdate(TodoRequest):
+    id: int
+
+
+class ResourceBulkUpdate(ResourceRequest):
+    id: int
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[int] = None
+    errors: Optional[List[dict]] = None
+
+
+class BulkResponse(BaseModel):
+    results: List[BulkItemResult]
+
+
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    title: str
+    score: float
+
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
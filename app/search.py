@@ -0,0 +1,163 @@
+"""
+Full-text search over a user's projects, todos and resources.
+
+The index is an inverted index kept in the `search_postings` table: one row per
+(user, term, document) with the term's weight in that document. It lives in the
+database rather than in FTS5 or tsvector so it works the same on SQLite and
+Postgres, and the routers update it in the same transaction as the write, so
+results never lag behind the data.
+
+A query looks up each term's postings through the primary key (user_id, term)
+and ranks documents by tf-idf, title words counting more than descriptions.
+"""
+import math
+import re
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import Connection, case, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+TITLE_WEIGHT = 3
+
+# kind -> (model, {field: weight}, title field)
+DOCUMENTS = {
+    "project": (models.Project, {"title": TITLE_WEIGHT, "brief_description": 1, "detailed_description": 1}, "title"),
+    "todo": (models.Todo, {"task_title": TITLE_WEIGHT, "task_description": 1}, "task_title"),
+    "resource": (models.Resource, {"resource_title": TITLE_WEIGHT, "resource_description": 1}, "resource_title"),
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [word[:MAX_TERM_LENGTH] for word in _WORD.findall(text.lower()) if len(word) > 1]
+
+
+def _field(doc, field: str):
+    return doc.get(field) if isinstance(doc, dict) else getattr(doc, field, None)
+
+
+def is_indexed(kind: str, fields: Iterable[str]) -> bool:
+    """Whether changing `fields` of a document changes its postings."""
+    return not DOCUMENTS[kind][1].keys().isdisjoint(fields)
+
+
+def postings(user_id: int, kind: str, doc_id: int, doc) -> list[dict]:
+    """Rows of `search_postings` for one document, `doc` is a model or a dict of its fields."""
+    _, fields, _ = DOCUMENTS[kind]
+    weights = Counter()
+    for field, field_weight in fields.items():
+        for term in tokenize(_field(doc, field)):
+            weights[term] += field_weight
+    return [{"user_id": user_id, "term": term, "kind": kind, "doc_id": doc_id, "weight": weight} for term, weight in weights.items()]
+
+
+async def index(db: AsyncSession, user_id: int, kind: str, docs: dict[int, object]):
+    """(Re)index documents by id, replacing whatever the index had for them."""
+    if not docs:
+        return
+    await unindex(db, kind, list(docs))
+    rows = [row for doc_id, doc in docs.items() for row in postings(user_id, kind, doc_id, doc)]
+    if rows:
+        await db.execute(insert(models.SearchPosting), rows)
+
+
+async def unindex(db: AsyncSession, kind: str, doc_ids):
+    """Drop documents from the index, `doc_ids` is a list of ids or a select of them."""
+    await db.execute(delete(models.SearchPosting).where(
+        models.SearchPosting.kind == kind, models.SearchPosting.doc_id.in_(doc_ids),
+    ))
+
+
+async def unindex_todo(db: AsyncSession, todo_id: int):
+    """Drop a todo and its resources, run before they are deleted or detached."""
+    await unindex(db, "resource", select(models.Resource.id).where(models.Resource.todo_id == todo_id))
+    await unindex(db, "todo", [todo_id])
+
+
+async def unindex_project(db: AsyncSession, project_id: int):
+    """Drop a project with its todos and resources, run before they are deleted."""
+    project_todos = select(models.Todo.id).where(models.Todo.project_id == project_id)
+    await unindex(db, "resource", select(models.Resource.id).where(models.Resource.todo_id.in_(project_todos)))
+    await unindex(db, "todo", project_todos)
+    await unindex(db, "project", [project_id])
+
+
+def owned_documents(kind: str):
+    """Select (user_id, id, indexed fields...) of every document of a kind."""
+    model, fields, _ = DOCUMENTS[kind]
+    stmt = select(models.Project.user_id, model.id, *(getattr(model, field) for field in fields))
+    if model is not models.Project:
+        stmt = stmt.join(models.Todo, models.Todo.project_id == models.Project.id)
+    if model is models.Resource:
+        stmt = stmt.join(models.Resource, models.Resource.todo_id == models.Todo.id)
+    return stmt.order_by(model.id)
+
+
+def rebuild(conn: Connection, batch_size: int = 1000) -> int:
+    """Rebuild the whole index from the documents tables, returns the number of documents indexed."""
+    conn.execute(delete(models.SearchPosting))
+    indexed = 0
+    for kind, (_, fields, _) in DOCUMENTS.items():
+        for rows in conn.execution_options(yield_per=batch_size).execute(owned_documents(kind)).partitions():
+            batch = [
+                posting
+                for user_id, doc_id, *values in rows
+                for posting in postings(user_id, kind, doc_id, dict(zip(fields, values)))
+            ]
+            if batch:
+                conn.execute(insert(models.SearchPosting), batch)
+            indexed += len(rows)
+    return indexed
+
+
+async def search(db: AsyncSession, user_id: int, query: str, limit: int, kinds: Iterable[str] = DOCUMENTS) -> list[dict]:
+    """The user's best matching documents for `query`, best first."""
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    kinds = list(kinds)
+    if not terms or not kinds:
+        return []
+    posting = models.SearchPosting
+    scope = (posting.user_id == user_id, posting.term.in_(terms), posting.kind.in_(kinds))
+
+    # document frequencies of the query terms, and the user's document count from the project counters
+    frequencies = dict((await db.execute(select(posting.term, func.count()).where(*scope).group_by(posting.term))).all())
+    if not frequencies:
+        return []
+    documents = (await db.execute(
+        select(func.count(models.Project.id), func.sum(models.Project.todo_count), func.sum(models.Project.resource_count))
+        .where(models.Project.user_id == user_id)
+    )).one()
+    total = sum(count or 0 for count in documents)
+    idf = {term: math.log(1 + max(total, df) / df) for term, df in frequencies.items()}
+
+    matched = func.count(posting.term)
+    score = func.sum(posting.weight * case(*((posting.term == term, weight) for term, weight in idf.items()), else_=0))
+    ranked = (await db.execute(
+        select(posting.kind, posting.doc_id, score.label("score"))
+        .where(*scope)
+        .group_by(posting.kind, posting.doc_id)
+        # documents that contain more of the query terms come first
+        .order_by(matched.desc(), score.desc(), posting.doc_id)
+        .limit(limit)
+    )).all()
+
+    titles = {}
+    for kind in {row.kind for row in ranked}:
+        model, _, title = DOCUMENTS[kind]
+        doc_ids = [row.doc_id for row in ranked if row.kind == kind]
+        # through the owner, a deleted project's documents are found until they are purged (app/purge.py)
+        owned = owned_documents(kind).where(models.Project.user_id == user_id, model.id.in_(doc_ids)).order_by(None)
+        for row in (await db.execute(owned)).mappings():
+            titles[kind, row["id"]] = row[title]
+    return [
+        {"kind": row.kind, "id": row.doc_id, "title": titles[row.kind, row.doc_id], "score": round(row.score, 4)}
+        for row in ranked if (row.kind, row.doc_id) in titles
+    ]
@@ -0,0 +1,166 @@
+"""
+Production entry point: imports `app.main:app` once, binds the listening socket,
+then forks `--workers` uvicorn processes that share both, on uvloop and httptools.
+
+    python -m app.serve --workers 4 --port 8000
+
+Forked workers start in milliseconds and share the parent's imported code, where
+`uvicorn --workers` starts each worker as a fresh interpreter that imports the app
+again. Each child drops the database connections it inherited (`database.dispose_after_fork`)
+before it serves, so no two processes ever use the same connection.
+
+SIGTERM or SIGINT to the parent stops it from respawning workers and forwards
+SIGTERM. Each worker then closes its socket, finishes its in-flight requests for
+up to `--graceful-timeout` seconds and runs the lifespan shutdown. Workers that
+are still alive after that are killed. A worker that dies on its own is replaced.
+
+Everything the app keeps in memory is per worker: /metrics, the rate limit
+buckets (use the redis backend) and the token and ownership caches.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from app.config import SERVE_WORKERS, SERVE_GRACEFUL_TIMEOUT
+
+logger = logging.getLogger("app.serve")
+
+# seconds between checks for exited workers
+POLL_INTERVAL = 0.2
+# a worker that dies sooner than this after starting is respawned after a pause, not in a tight loop
+MIN_WORKER_LIFETIME = 1.0
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Arbiter:
+    """Forks the workers, replaces the ones that die and shuts them all down on a signal."""
+
+    def __init__(self, app, sock: socket.socket, workers: int, graceful_timeout: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while not self.stopping:
+            self.reap(respawn=True)
+            time.sleep(POLL_INTERVAL)
+        self.shutdown()
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # in the worker from here on, it never returns into the arbiter's loop
+        status = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.serve()
+            status = 0
+        except BaseException:
+            logger.exception("worker %d crashed", os.getpid())
+        finally:
+            os._exit(status)
+
+    def serve(self):
+        from app.database import dispose_after_fork
+
+        dispose_after_fork()
+        config = uvicorn.Config(
+            self.app,
+            loop="uvloop",
+            http="httptools",
+            lifespan="on",
+            log_level=self.log_level,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        # uvicorn installs its own SIGTERM handler, which drains and then runs the lifespan shutdown
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def reap(self, respawn: bool):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if not pid:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            if respawn and not self.stopping:
+                logger.warning("worker %d exited with status %d, starting a new one", pid, os.waitstatus_to_exitcode(status))
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+                self.spawn()
+
+    def shutdown(self):
+        logger.info("stopping %d workers", len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        # the drain, plus a little for the lifespan shutdown
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap(respawn=False)
+            time.sleep(POLL_INTERVAL)
+        for pid in self.children:
+            logger.error("worker %d didn't stop in time, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self.reap(respawn=False)
+            time.sleep(POLL_INTERVAL)
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="serve the API with forked uvicorn workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVE_GRACEFUL_TIMEOUT, help="seconds workers get to finish requests on shutdown")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(process)d] %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(args.log_level.upper())
+    # preload: every worker gets the imported app for free, and an import error stops the launch here
+    from app.main import app
+
+    sock = bind(args.host, args.port, args.backlog)
+    logger.info("listening on %s:%d with %d workers", args.host, args.port, args.workers)
+    Arbiter(app, sock, args.workers, args.graceful_timeout, args.log_level).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import delete, select
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.blobstore import get_blob_store, release
+from app.config import THUMBNAIL_WORKERS
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# square edge in pixels of every variant made for an upload
+VARIANT_SIZES = {
+    "small": 64,
+    "medium": 128,
+    "large": 256,
+}
+VARIANT_FORMAT = "WEBP"
+VARIANT_MIMETYPE = "image/webp"
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def render_variants(path: str) -> list[tuple[str, int, int, bytes]]:
+    """Decode the image at `path` once and encode every variant, returns (size, width, height, data)."""
+    # imported here, it runs in the worker processes and the app itself never needs Pillow
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGBA")
+        variants = []
+        for name, edge in VARIANT_SIZES.items():
+            thumb = ImageOps.fit(original, (edge, edge), Image.LANCZOS)
+            out = io.BytesIO()
+            thumb.save(out, VARIANT_FORMAT, quality=85, method=4)
+            variants.append((name, thumb.width, thumb.height, out.getvalue()))
+        return variants
+
+
+def store_variants(rendered: list[tuple[str, int, int, bytes]]) -> list[dict]:
+    store = get_blob_store()
+    return [
+        {"size": name, "width": width, "height": height, "mimetype": VARIANT_MIMETYPE, "blob_key": store.put_bytes(data)[0]}
+        for name, width, height, data in rendered
+    ]
+
+
+async def generate_variants(image_id: int):
+    """
+    Build the thumbnails of an image in the worker pool and replace its variant rows.
+
+    Meant to run as a background task after upload, so decoding never happens on
+    the request path. If the image was replaced again meanwhile the result is dropped,
+    the newer upload schedules its own run.
+    """
+    async with AsyncSessionLocal() as db:
+        blob_key = await db.scalar(select(models.ImageModel.blob_key).where(models.ImageModel.id == image_id))
+    if blob_key is None:
+        return
+
+    try:
+        rendered = await asyncio.get_running_loop().run_in_executor(_get_executor(), render_variants, get_blob_store().path(blob_key))
+    except Exception:
+        logger.exception("could not make thumbnails for image %s", image_id)
+        return
+    variants = await run_in_threadpool(store_variants, rendered)
+
+    async with AsyncSessionLocal() as db:
+        current_key = await db.scalar(select(models.ImageModel.blob_key).where(models.ImageModel.id == image_id))
+        if current_key != blob_key:
+            await release(db, [variant["blob_key"] for variant in variants])
+            return
+        old_keys = (await db.scalars(select(models.ImageVariant.blob_key).where(models.ImageVariant.image_id == image_id))).all()
+        await db.execute(delete(models.ImageVariant).where(models.ImageVariant.image_id == image_id))
+        db.add_all(models.ImageVariant(image_id=image_id, **variant) for variant in variants)
+        await db.commit()
+        await release(db, old_keys)
@@ -0,0 +1,59 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from app.config import TOKEN_CACHE_SIZE
+
+
+class TokenCache:
+    """
+    Bounded LRU of tokens whose signature was already checked, keyed by a sha256
+    of the token so raw tokens are never kept. An entry is dropped once the
+    token's `exp` passes, so a cached token is never accepted past its expiry.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        if not self.max_size:
+            return None
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        # tokens without an expiry would live here forever, don't cache them
+        if not self.max_size or expires_at is None:
+            return
+        self._entries[self._key(token)] = (float(expires_at), claims)
+        self._entries.move_to_end(self._key(token))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
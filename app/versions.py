@@ -0,0 +1,46 @@
+"""
+Per-user change versions for conditional GETs.
+
+Every project, todo and resource write bumps `users.data_version` in its own transaction,
+so a list a user fetched is still current as long as the version hasn't moved.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import select, update
+
+from app import models
+from app.database_dependency import async_db_dependency
+from app.responses import etag_matches
+from app.routers.auth import user_dependency
+
+
+def query_key(request: Request) -> str:
+    """Short hash of the route and its sorted query parameters, so each page and shape of a list gets its own tag."""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return hashlib.sha256(f"{request.url.path}?{query}".encode()).hexdigest()[:16]
+
+
+def bump(user_id: int):
+    """UPDATE that marks everything the user can list as changed."""
+    return update(models.User).where(models.User.id == user_id).values(data_version=models.User.data_version + 1)
+
+
+async def not_modified(request: Request, response: Response, db: async_db_dependency, user: user_dependency):
+    """
+    Route dependency for list endpoints: sets an ETag from the user's version and the
+    request's `query_key`, and answers a matching If-None-Match with 304 before the
+    route runs its query.
+    """
+    if user is None:
+        return
+    version = await db.scalar(select(models.User.data_version).where(models.User.id == user.get('id')))
+    if version is None:
+        return
+    # read before the list query, so a write racing the list can only make the tag older than the body
+    etag = f'W/"{user.get("id")}-{version}-{query_key(request)}"'
+    headers = {"etag": etag, "cache-control": "private, no-cache", "vary": "Authorization"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
@@ -0,0 +1,84 @@
+"""
+Concurrent-request throughput of a handler using the sync session (`db_dependency`)
+versus the async session (`async_db_dependency`).
+
+Both routes run the same deliberately slow query, requests are driven in-process
+through httpx at the given concurrency. Keep the concurrency within the pool size
+(5 + 10 overflow by default): past that the sync route blocks the loop waiting for
+a connection that only the loop itself can give back.
+
+    python -m benchmarks.bench_async_db --requests 400 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/ideamentor_bench.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.database_dependency import db_dependency, async_db_dependency
+
+# counts to :n with a recursive CTE, works on sqlite and postgres
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c"
+)
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync")
+async def sync_route(db: db_dependency, n: int):
+    return {"count": db.execute(SLOW_QUERY, {"n": n}).scalar()}
+
+
+@bench_app.get("/async")
+async def async_route(db: async_db_dependency, n: int):
+    return {"count": (await db.execute(SLOW_QUERY, {"n": n})).scalar()}
+
+
+async def drive(path: str, requests: int, concurrency: int, n: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=bench_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, params={"n": n})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=200_000, help="size of the slow query")
+    args = parser.parse_args()
+
+    print(f"{'route':<8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for path in ("/sync", "/async"):
+        result = asyncio.run(drive(path, args.requests, args.concurrency, args.rows))
+        print(f"{path:<8} {result['rps']:>10.1f} {result['p50']:>10.1f} {result['p99']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
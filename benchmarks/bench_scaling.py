@@ -0,0 +1,101 @@
+"""
+Throughput of `python -m app.serve` as the worker count grows: the load test's
+traffic mix is run against the forked server once per worker count, each time on
+a freshly seeded database.
+
+    python -m benchmarks.bench_scaling --database-url postgresql://localhost/ideamentor_bench
+    python -m benchmarks.bench_scaling --workers 1 2 4 8 --concurrency 64 --duration 20
+
+On Linux each server is pinned to as many cores as it has workers and the load
+generator to the cores left over, so a row measures N workers on N cores. When
+the machine has too few cores the server and the load generator share them and the
+numbers say more about the machine than about the app. The efficiency column is the
+throughput per worker against the one-worker run.
+
+SQLite serializes writes across processes, so beyond a couple of workers it measures
+the database lock. Point --database-url at a dedicated PostgreSQL database for real numbers.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.loadtest import ROOT, configure, prepare_database, drive, free_port
+
+
+def default_workers() -> list[int]:
+    counts, n = [], 1
+    while n <= (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts
+
+
+def pin(cores: set[int]):
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+
+async def measure(args, workers: int) -> dict:
+    import httpx
+
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    server_cores = set(available[:workers]) if len(available) > workers else set()
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(), preexec_fn=lambda: pin(server_cores),
+    )
+    pin(set(available) - server_cores)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("app.serve didn't start")
+            routes = await drive(client, args.users, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        server.terminate()
+        server.wait()
+        pin(set(available))
+    return {**routes["all"], "pinned": bool(server_cores)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=f"sqlite:///{tempfile.gettempdir()}/ideamentor_scaling.db")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers(), help="worker counts to measure")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    parser.add_argument("--users", type=int, default=50, help="seeded accounts")
+    parser.add_argument("--todos", type=int, default=200, help="seeded todos per account")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    rows = []
+    for workers in args.workers:
+        prepare_database(args.database_url, args.users, args.todos)
+        rows.append((workers, asyncio.run(measure(args, workers))))
+
+    print(f"{'workers':>7} {'pinned':>6} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'efficiency':>10}")
+    base = next((row["rps"] / workers for workers, row in rows if row["count"]), None)
+    for workers, row in rows:
+        if not row["count"]:
+            print(f"{workers:>7} {'yes' if row['pinned'] else 'no':>6} {row['errors']:>7}")
+            continue
+        efficiency = row["rps"] / workers / base if base else 0
+        print(f"{workers:>7} {'yes' if row['pinned'] else 'no':>6} {row['errors']:>7} {row['rps']:>9.1f} "
+              f"{row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f} {efficiency:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Latency of `/search` queries (`app.search.search`) against a scratch database with
+`--rows` todos spread over `--users` users, next to a LIKE scan for the same words,
+which is what search costs without the index (every match has to be found before
+results can be ranked, so the scan has no LIMIT).
+
+Titles and descriptions are drawn from a Zipf-like vocabulary so that some query
+terms are common and most are rare. Building the 1M-row database takes a few minutes.
+
+    python -m benchmarks.bench_search --rows 1000000 --users 100 --queries 200
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+DB_PATH = f"{tempfile.gettempdir()}/ideamentor_bench_search.db"
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{DB_PATH}")
+
+from sqlalchemy import func, insert, or_, select
+
+from app import models, search
+from app.database import AsyncSessionLocal, Base, engine
+
+VOCABULARY = [f"word{i}" for i in range(20_000)]
+# Zipf-like: the n-th word is drawn with weight 1/n
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+PROJECTS_PER_USER = 20
+BATCH = 10_000
+
+
+def words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=n))
+
+
+def build(rows: int, users: int, rng: random.Random):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    Base.metadata.create_all(engine)
+    projects = users * PROJECTS_PER_USER
+    todos_per_project = max(rows // projects, 1)
+    projects_per_batch = max(BATCH // todos_per_project, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": user_id, "email": f"user{user_id}@example.com", "username": f"user{user_id}", "hashed_password": "x"}
+            for user_id in range(1, users + 1)
+        ])
+        conn.execute(insert(models.Project), [
+            {"id": project_id, "title": words(rng, 3), "user_id": (project_id - 1) // PROJECTS_PER_USER + 1, "todo_count": todos_per_project}
+            for project_id in range(1, projects + 1)
+        ])
+        todo_id = 0
+        for first_project in range(1, projects + 1, projects_per_batch):
+            todos, postings = [], []
+            for project_id in range(first_project, min(first_project + projects_per_batch, projects + 1)):
+                user_id = (project_id - 1) // PROJECTS_PER_USER + 1
+                for _ in range(todos_per_project):
+                    todo_id += 1
+                    todo = {"id": todo_id, "task_title": words(rng, 3), "task_description": words(rng, 8), "project_id": project_id}
+                    todos.append(todo)
+                    postings.extend(search.postings(user_id, "todo", todo_id, todo))
+            conn.execute(insert(models.Todo), todos)
+            conn.execute(insert(models.SearchPosting), postings)
+    return todo_id
+
+
+def percentiles(latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p = lambda q: latencies[max(int(len(latencies) * q) - 1, 0)] * 1000
+    return f"{statistics.median(latencies) * 1000:>10.2f} {p(0.95):>10.2f} {p(0.99):>10.2f}"
+
+
+async def time_queries(queries: list[tuple[int, str]], limit: int):
+    indexed, scanned = [], []
+    async with AsyncSessionLocal() as db:
+        for user_id, query in queries:
+            start = time.perf_counter()
+            await search.search(db, user_id, query, limit)
+            indexed.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            terms = query.split()
+            (await db.execute(
+                select(models.Todo.id, models.Todo.task_title, models.Todo.task_description)
+                .join(models.Project, models.Project.id == models.Todo.project_id)
+                .where(models.Project.user_id == user_id, or_(*(
+                    column.like(f"%{term}%") for term in terms for column in (models.Todo.task_title, models.Todo.task_description)
+                )))
+            )).all()
+            scanned.append(time.perf_counter() - start)
+    return indexed, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of todos")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    todos = build(args.rows, args.users, rng)
+    with engine.connect() as conn:
+        postings = conn.execute(select(func.count()).select_from(models.SearchPosting)).scalar()
+    print(f"built {todos} todos, {postings} postings in {time.perf_counter() - started:.0f}s")
+
+    # one and two word queries, words drawn from the same distribution as the documents
+    queries = [(rng.randint(1, args.users), words(rng, rng.choice((1, 2)))) for _ in range(args.queries)]
+    indexed, scanned = asyncio.run(time_queries(queries, args.limit))
+
+    print(f"{'query':<8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    print(f"{'index':<8} {percentiles(indexed)}")
+    print(f"{'LIKE':<8} {percentiles(scanned)}")
+
+
+if __name__ == "__main__":
+    main()
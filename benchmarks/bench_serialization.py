@@ -0,0 +1,89 @@
+"""
+Time to answer a list of `--rows` todos through FastAPI's `response_model` path
+(ORM objects validated into `TodoResponse`, then encoded) versus the fast path the
+list routes use (`select_schema` rows as dicts, encoded by `FastJSONResponse`).
+
+Both routes run their query against the same scratch database and are driven
+in-process through httpx, so the numbers include loading the rows.
+
+    python -m benchmarks.bench_serialization --rows 10000 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+DB_PATH = f"{tempfile.gettempdir()}/ideamentor_bench_serialization.db"
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{DB_PATH}")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert, select
+
+from app import models, schemas
+from app.database import Base, engine
+from app.database_dependency import async_db_dependency
+from app.pagination import select_schema
+from app.responses import FastJSONResponse
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/validated", response_model=schemas.Page[schemas.TodoResponse])
+async def validated(db: async_db_dependency):
+    return {"items": (await db.scalars(select(models.Todo).order_by(models.Todo.id))).all(), "next": None}
+
+
+@bench_app.get("/fast", response_model=schemas.Page[schemas.TodoResponse])
+async def fast(db: async_db_dependency):
+    result = await db.execute(select_schema(models.Todo, schemas.TodoResponse).order_by(models.Todo.id))
+    keys = list(result.keys())
+    return FastJSONResponse({"items": [dict(zip(keys, row)) for row in result], "next": None})
+
+
+def build(rows: int):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "email": "bench@example.com", "username": "bench", "hashed_password": "x"}])
+        conn.execute(insert(models.Project), [{"id": 1, "title": "bench", "user_id": 1}])
+        conn.execute(insert(models.Todo), [
+            {"task_title": f"todo {i}", "task_description": f"description of todo number {i}", "completed": i % 3 == 0, "project_id": 1}
+            for i in range(rows)
+        ])
+
+
+async def drive(path: str, requests: int):
+    latencies, size = [], 0
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            size = len(response.content)
+    return statistics.median(latencies) * 1000, min(latencies) * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    build(args.rows)
+    print(f"{'route':<12} {'p50 ms':>10} {'min ms':>10} {'bytes':>10}")
+    results = {}
+    for path in ("/validated", "/fast"):
+        results[path] = asyncio.run(drive(path, args.requests))
+        p50, fastest, size = results[path]
+        print(f"{path:<12} {p50:>10.1f} {fastest:>10.1f} {size:>10}")
+    print(f"speedup {results['/validated'][0] / results['/fast'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
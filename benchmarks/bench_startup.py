@@ -0,0 +1,132 @@
+"""
+Cold start of the app: each run is a fresh interpreter that imports `app.main`,
+runs the lifespan startup and answers one request (a failed login, so it goes
+through the rate limiter and one database query), then shuts down.
+
+Reported per phase as the median and min over `--runs`:
+
+    import          python -c "import app.main"
+    startup         the lifespan hook up to its yield
+    first request   the first response, including the first database connection
+    process         interpreter start to exit, measured from outside
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --top 15
+
+For CI, --max-import-ms and --max-first-request-ms make the exit status 1 when the
+median goes over budget. Budgets depend on the machine, set them from a run on the CI runner.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DB_PATH = f"{tempfile.gettempdir()}/ideamentor_bench_startup.db"
+
+CHILD = """
+import asyncio, json, time
+
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+# the client is not part of the app, keep its import out of the startup phase
+import httpx
+client_imported = time.perf_counter()
+
+async def first_request():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        up = time.perf_counter()
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.post("/auth/token", data={"username": "nobody", "password": "wrong-password"})
+        assert response.status_code == 401, response.text
+        answered = time.perf_counter()
+    return up, answered
+
+up, answered = asyncio.run(first_request())
+print(json.dumps({"import": imported - started, "startup": up - client_imported, "first request": answered - up}))
+"""
+
+
+def environment() -> dict:
+    return {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URL": f"sqlite:///{DB_PATH}",
+        "secret_key": "startup-secret",
+        "algorithm": "HS256",
+        "AUTH_SECRET": "startup-session-secret",
+    }
+
+
+def prepare_database():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=environment(), check=True, capture_output=True)
+
+
+def run_once() -> dict:
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=environment(), check=True, capture_output=True, text=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - started
+    return timings
+
+
+def slowest_imports(top: int) -> list[tuple[int, str]]:
+    """Modules imported directly by the app (or by `site`), by cumulative import time in microseconds."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=ROOT, env=environment(),
+                            check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # the top level module is indented by one space, what it imports by three
+        if name.startswith(" " * 3) and not name.startswith(" " * 4):
+            modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports of app.main")
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median import time is over this")
+    parser.add_argument("--max-first-request-ms", type=float, help="fail when the median time to the first response is over this")
+    args = parser.parse_args()
+
+    prepare_database()
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"{'phase':<15} {'median ms':>10} {'min ms':>10}")
+    medians = {}
+    for phase in ("import", "startup", "first request", "process"):
+        values = [run[phase] * 1000 for run in runs]
+        medians[phase] = statistics.median(values)
+        print(f"{phase:<15} {medians[phase]:>10.1f} {min(values):>10.1f}")
+
+    if args.top:
+        print(f"\n{'import':<50} {'ms':>8}")
+        for cumulative, name in slowest_imports(args.top):
+            print(f"{name:<50} {cumulative / 1000:>8.1f}")
+
+    over = []
+    if args.max_import_ms is not None and medians["import"] > args.max_import_ms:
+        over.append(f"import {medians['import']:.0f} ms > {args.max_import_ms:.0f} ms")
+    to_first_response = medians["import"] + medians["startup"] + medians["first request"]
+    if args.max_first_request_ms is not None and to_first_response > args.max_first_request_ms:
+        over.append(f"first request {to_first_response:.0f} ms > {args.max_first_request_ms:.0f} ms")
+    if over:
+        print("\nover budget: " + ", ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Per-request cost of the auth dependency (`get_current_user`) with the
+verified-token cache on and off.
+
+    python -m benchmarks.bench_token_cache --calls 20000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/ideamentor_bench.db")
+os.environ.setdefault("secret_key", "benchmark-secret")
+os.environ.setdefault("algorithm", "HS256")
+
+from app.routers.auth import create_access_token, get_current_user
+from app.token_cache import token_cache
+
+
+async def time_calls(token: str, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await get_current_user(token)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    token, _ = create_access_token("bench", 1)
+    size = token_cache.max_size
+
+    token_cache.max_size = 0
+    uncached = asyncio.run(time_calls(token, args.calls))
+
+    token_cache.max_size = size or 1
+    token_cache.clear()
+    cached = asyncio.run(time_calls(token, args.calls))
+
+    print(f"{'cache':<6} {'us/request':>12}")
+    print(f"{'off':<6} {uncached * 1e6:>12.2f}")
+    print(f"{'on':<6} {cached * 1e6:>12.2f}")
+    print(f"speedup {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
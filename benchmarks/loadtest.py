@@ -0,0 +1,325 @@
+"""
+End-to-end load test of the API: mixed traffic against `app.main.app`, either
+in-process through httpx or over HTTP to a uvicorn server this script starts.
+
+Each virtual user logs in once and then loops over weighted operations (login,
+list projects, list todos, create todo, add resource, fetch profile image) until
+the run ends. The report has RPS and p50/p95/p99 per route.
+
+    python -m benchmarks.loadtest --concurrency 20 --duration 30
+    python -m benchmarks.loadtest --uvicorn --database-url postgresql://localhost/ideamentor_bench
+
+A run can be saved as a baseline and later runs compared against it; the exit
+status is 1 when any route's p95 grew, or its RPS fell, by more than the threshold.
+Baselines only compare runs on the same machine and database.
+
+    python -m benchmarks.loadtest --save-baseline benchmarks/baselines/inprocess-sqlite.json
+    python -m benchmarks.loadtest --compare benchmarks/baselines/inprocess-sqlite.json --threshold 0.25
+
+The rate limits of the auth endpoints are raised for the run, every virtual user
+shares one client address.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+PASSWORD = "loadtest-password"
+
+
+def profile_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (80, 140, 200)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+PNG = profile_png()
+
+# route -> weight of the mix
+MIX = {
+    "login": 2,
+    "list projects": 25,
+    "list todos": 25,
+    "create todo": 15,
+    "add resource": 13,
+    "profile image": 20,
+}
+
+
+def configure(database_url: str):
+    """Environment for the app under test, set before anything imports `app`."""
+    os.environ["SQLALCHEMY_DATABASE_URL"] = database_url
+    os.environ.setdefault("secret_key", "loadtest-secret")
+    os.environ.setdefault("algorithm", "HS256")
+    os.environ.setdefault("AUTH_SECRET", "loadtest-session-secret")
+    os.environ.setdefault("BLOB_STORE_PATH", f"{tempfile.gettempdir()}/ideamentor_loadtest_blobs")
+    for name in ("RATE_LIMIT_IP_BURST", "RATE_LIMIT_IP_PER_MINUTE", "RATE_LIMIT_ACCOUNT_BURST", "RATE_LIMIT_ACCOUNT_PER_MINUTE"):
+        os.environ.setdefault(name, "1000000")
+    os.environ.setdefault("AUTH_MAX_CONCURRENCY", "1000")
+
+
+def prepare_database(database_url: str, users: int, todos: int):
+    """
+    Fresh schema through the migrations, then `users` active users with a project of `todos` todos each.
+    The database is wiped first, point this at a dedicated one.
+    """
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import insert
+
+    alembic_cfg = Config(str(ROOT / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(ROOT / "alembic"))
+    if database_url.startswith("sqlite:///"):
+        path = database_url.removeprefix("sqlite:///")
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        command.downgrade(alembic_cfg, "base")
+    command.upgrade(alembic_cfg, "head")
+
+    from app import models
+    from app.database import engine
+    from app.hashing import bcrypt_context
+
+    hashed = bcrypt_context.hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "email": f"load{i}@example.com", "username": f"loaduser{i}", "firstname": "load", "lastname": "test",
+             "hashed_password": hashed, "is_active": True}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(models.Project), [
+            {"id": i, "title": f"project {i}", "brief_description": "load test", "user_id": i, "todo_count": todos}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(models.Todo), [
+            {"task_title": f"todo {n}", "task_description": "seeded", "project_id": i}
+            for i in range(1, users + 1) for n in range(todos)
+        ])
+    # a pooled sqlite connection would keep writing to the file the next call removes
+    engine.dispose()
+
+
+class VirtualUser:
+    def __init__(self, client, number: int, rng: random.Random):
+        self.client = client
+        self.number = number
+        self.rng = rng
+        self.headers = {}
+        self.todo_ids: list[int] = []
+
+    async def login(self):
+        response = await self.client.post("/auth/token", data={"username": f"loaduser{self.number}", "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def setup(self):
+        await self.login()
+        response = await self.client.post("/profile/upload/", files={"file": ("me.png", PNG, "image/png")}, headers=self.headers)
+        response.raise_for_status()
+        response = await self.client.get("/todos/alltodos", params={"limit": 20}, headers=self.headers)
+        self.todo_ids = [todo["id"] for todo in response.json()["items"]]
+
+    async def run(self, operation: str):
+        if operation == "login":
+            return await self.login()
+        if operation == "list projects":
+            return await self.client.get("/project/getallprojects", headers=self.headers)
+        if operation == "list todos":
+            return await self.client.get("/todos/alltodos", params={"limit": 50}, headers=self.headers)
+        if operation == "create todo":
+            response = await self.client.post(f"/todos/new_todo/{self.number}", json={
+                "task_title": f"load todo {self.rng.randrange(10 ** 6)}", "task_description": "created under load",
+            }, headers=self.headers)
+            return response
+        if operation == "add resource":
+            return await self.client.post(f"/resource/new_resource/{self.rng.choice(self.todo_ids)}", json={
+                "resource_title": "load resource", "resource_description": "a resource added under load", "link": "https://example.com",
+            }, headers=self.headers)
+        if operation == "profile image":
+            return await self.client.get("/profile/get_profile", headers=self.headers)
+        raise ValueError(operation)
+
+
+async def drive(client, users: int, concurrency: int, duration: float, warmup: float, seed: int):
+    rng = random.Random(seed)
+    virtual_users = [VirtualUser(client, rng.randint(1, users) if concurrency > users else i + 1, random.Random(seed + i)) for i in range(concurrency)]
+    await asyncio.gather(*(user.setup() for user in virtual_users))
+
+    operations, weights = list(MIX), list(MIX.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def loop(user: VirtualUser):
+        while time.perf_counter() < stop_at:
+            operation = user.rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            response = await user.run(operation)
+            elapsed = time.perf_counter() - start
+            if start < measure_from:
+                continue
+            if response.status_code >= 400:
+                errors[operation] += 1
+            else:
+                latencies[operation].append(elapsed)
+
+    await asyncio.gather(*(loop(user) for user in virtual_users))
+    return report(latencies, errors, duration)
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))] * 1000
+
+
+def report(latencies: dict, errors: dict, duration: float) -> dict:
+    routes = {}
+    everything = []
+    for operation in MIX:
+        ordered = sorted(latencies.get(operation, []))
+        everything.extend(ordered)
+        if not ordered:
+            routes[operation] = {"count": 0, "errors": errors.get(operation, 0)}
+            continue
+        routes[operation] = {
+            "count": len(ordered),
+            "errors": errors.get(operation, 0),
+            "rps": len(ordered) / duration,
+            "p50": statistics.median(ordered) * 1000,
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+        }
+    everything.sort()
+    routes["all"] = {
+        "count": len(everything),
+        "errors": sum(errors.values()),
+        "rps": len(everything) / duration,
+        "p50": statistics.median(everything) * 1000 if everything else 0,
+        "p95": percentile(everything, 0.95) if everything else 0,
+        "p99": percentile(everything, 0.99) if everything else 0,
+    }
+    return routes
+
+
+def print_report(routes: dict):
+    print(f"{'route':<16} {'count':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, row in routes.items():
+        if not row["count"]:
+            print(f"{route:<16} {0:>8} {row['errors']:>7}")
+            continue
+        print(f"{route:<16} {row['count']:>8} {row['errors']:>7} {row['rps']:>9.1f} {row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f}")
+
+
+def compare(routes: dict, baseline: dict, threshold: float) -> list[str]:
+    """Routes whose p95 grew or whose throughput fell by more than `threshold` against the baseline."""
+    regressions = []
+    for route, old in baseline["routes"].items():
+        new = routes.get(route)
+        if not new or not new["count"] or not old.get("count"):
+            continue
+        if new["p95"] > old["p95"] * (1 + threshold):
+            regressions.append(f"{route}: p95 {old['p95']:.2f} ms -> {new['p95']:.2f} ms")
+        if new["rps"] < old["rps"] * (1 - threshold):
+            regressions.append(f"{route}: {old['rps']:.1f} -> {new['rps']:.1f} req/s")
+    return regressions
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_inprocess(args):
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        # a failing request is a 500 in the report, as it would be under uvicorn
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await drive(client, args.users, args.concurrency, args.duration, args.warmup, args.seed)
+
+
+async def run_uvicorn(args):
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning", *args.uvicorn_args],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn didn't start")
+            return await drive(client, args.users, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=f"sqlite:///{tempfile.gettempdir()}/ideamentor_loadtest.db")
+    parser.add_argument("--uvicorn", action="store_true", help="serve the app with uvicorn in a subprocess instead of in-process")
+    parser.add_argument("--uvicorn-args", nargs=argparse.REMAINDER, default=[], help="extra uvicorn arguments, must come last")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--users", type=int, default=50, help="seeded accounts")
+    parser.add_argument("--todos", type=int, default=200, help="seeded todos per account")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path, help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    prepare_database(args.database_url, args.users, args.todos)
+    routes = asyncio.run(run_uvicorn(args) if args.uvicorn else run_inprocess(args))
+    print_report(routes)
+
+    settings = {key: getattr(args, key) for key in ("uvicorn", "concurrency", "users", "todos", "duration")}
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps({"settings": settings, "routes": routes}, indent=2) + "\n")
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["settings"] != settings:
+            print(f"warning: baseline ran with {baseline['settings']}, this run with {settings}")
+        regressions = compare(routes, baseline, args.threshold)
+        if regressions:
+            print(f"regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP = tempfile.mkdtemp(prefix="ideamentor_tests_")
+PASSWORD = "test-password"
+
+# the app reads its settings at import, so they are set before anything imports it
+os.environ.update({
+    "SQLALCHEMY_DATABASE_URL": f"sqlite:///{TMP}/test.db",
+    "secret_key": "test-secret",
+    "algorithm": "HS256",
+    "AUTH_SECRET": "test-session-secret",
+    "BLOB_STORE_PATH": f"{TMP}/blobs",
+    "MAX_IMAGE_SIZE": str(256 * 1024),
+    "OTP_STORE_BACKEND": "memory",
+    "RATE_LIMIT_IP_BURST": "1000000",
+    "RATE_LIMIT_IP_PER_MINUTE": "1000000",
+    "RATE_LIMIT_ACCOUNT_BURST": "1000000",
+    "RATE_LIMIT_ACCOUNT_PER_MINUTE": "1000000",
+})
+
+
+@pytest.fixture(scope="session")
+def client():
+    from alembic import command
+    from alembic.config import Config
+    from fastapi.testclient import TestClient
+
+    alembic_cfg = Config(str(ROOT / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(alembic_cfg, "head")
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def password_hash():
+    from app.hashing import bcrypt_context
+
+    return bcrypt_context.hash(PASSWORD)
+
+
+@pytest.fixture
+def make_user(client, password_hash):
+    """Creates an active account and returns the headers of a logged in session for it."""
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import engine
+
+    def make(prefix: str = "user") -> dict:
+        username = f"{prefix}{uuid.uuid4().hex[:8]}"
+        with engine.begin() as conn:
+            conn.execute(insert(models.User).values(
+                email=f"{username}@example.com", username=username, firstname="test", lastname="user",
+                hashed_password=password_hash, is_active=True,
+            ))
+        response = client.post("/auth/token", data={"username": username, "password": PASSWORD})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return make
+
+
+@pytest.fixture
+def project(client):
+    """Creates a project for the given headers and returns its id."""
+    def make(headers: dict, title: str = "test project") -> int:
+        response = client.post("/project/new", json={"title": title, "brief_description": "brief"}, headers=headers)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    return make
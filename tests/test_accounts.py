@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+from app import models
+from app.database import SessionLocal
+
+
+def writes(client, headers) -> list[int]:
+    return [
+        client.post("/project/new", json={"title": "a project", "brief_description": "brief"}, headers=headers).status_code,
+        client.post("/profile/upload/", files={"file": ("a.png", b"not really a png", "image/png")}, headers=headers).status_code,
+        client.put("/users/change_password", json={"password": "whatever", "new_password": "whatever2"}, headers=headers).status_code,
+        client.get("/users/user_info", headers=headers).status_code,
+    ]
+
+
+def test_token_of_a_deleted_account(client, make_user):
+    headers = make_user()
+    assert client.delete("/users/delete_account", headers=headers).status_code == 200
+
+    assert writes(client, headers) == [401] * 4
+
+
+def test_token_of_an_account_being_purged(client, make_user):
+    headers = make_user()
+    user_id = client.get("/users/user_info", headers=headers).json()["id"]
+    with SessionLocal.begin() as db:
+        db.execute(update(models.User).where(models.User.id == user_id).values(deleted_at=datetime.now(timezone.utc), is_active=False))
+
+    assert writes(client, headers) == [401] * 4
@@ -0,0 +1,13 @@
+import uuid
+
+from app import ratelimit
+
+
+def test_verify_is_rate_limited_per_email(client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "ACCOUNT_LIMIT", ratelimit.Limit(3, 1e-6))
+    email = f"{uuid.uuid4().hex[:8]}@example.com"
+
+    statuses = [client.post("/auth/verify/123456", params={"email": email}).status_code for _ in range(4)]
+
+    assert statuses == [404, 404, 404, 429]
+    assert client.post("/auth/verify/123456", params={"email": f"other{email}"}).status_code == 404
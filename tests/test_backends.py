@@ -0,0 +1,33 @@
+import pytest
+
+from app.blobstore import BlobStore
+
+
+def test_incomplete_blob_store_fails_when_created():
+    class PutOnly(BlobStore):
+        def put_file(self, src, max_size=None):
+            return "key", 0
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+def test_incomplete_otp_store_fails_when_created():
+    from app.otp_store import OTPStore
+
+    class IssueOnly(OTPStore):
+        async def issue(self, email):
+            return "123456"
+
+    with pytest.raises(TypeError):
+        IssueOnly()
+
+
+def test_incomplete_rate_limit_backend_fails_when_created():
+    from app.ratelimit import RateLimitBackend
+
+    class NoTake(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        NoTake()
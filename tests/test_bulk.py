@@ -0,0 +1,38 @@
+from sqlalchemy import select
+
+from app import models
+from app.database import SessionLocal
+
+RESOURCE = {"resource_description": "a description", "link": "https://example.com"}
+
+
+def created_ids(response) -> dict[int, int]:
+    response.raise_for_status()
+    return {result["index"]: result["id"] for result in response.json()["results"] if result["status"] == 201}
+
+
+def test_bulk_todo_ids_match_their_items(client, make_user, project):
+    headers = make_user()
+    project_id = project(headers)
+    items = [{"task_title": f"todo {n}", "task_description": None} for n in range(20)]
+    items.insert(5, {"task_title": "x"})
+
+    ids = created_ids(client.post(f"/todos/bulk/{project_id}", json=items, headers=headers))
+
+    assert 5 not in ids and len(ids) == 20
+    with SessionLocal() as db:
+        titles = dict(db.execute(select(models.Todo.id, models.Todo.task_title).where(models.Todo.id.in_(ids.values()))).all())
+    assert {index: titles[todo_id] for index, todo_id in ids.items()} == {index: items[index]["task_title"] for index in ids}
+
+
+def test_bulk_resource_ids_match_their_items(client, make_user, project):
+    headers = make_user()
+    project_id = project(headers)
+    todo_id = created_ids(client.post(f"/todos/bulk/{project_id}", json=[{"task_title": "a todo", "task_description": None}], headers=headers))[0]
+    items = [{**RESOURCE, "resource_title": f"resource {n}"} for n in range(20)]
+
+    ids = created_ids(client.post(f"/resource/bulk/{todo_id}", json=items, headers=headers))
+
+    with SessionLocal() as db:
+        titles = dict(db.execute(select(models.Resource.id, models.Resource.resource_title).where(models.Resource.id.in_(ids.values()))).all())
+    assert {index: titles[resource_id] for index, resource_id in ids.items()} == {index: items[index]["resource_title"] for index in ids}
@@ -0,0 +1,10 @@
+import pytest
+
+from app.cli import _full_scans, hot_queries
+from app.database import engine
+
+
+@pytest.mark.parametrize("name", hot_queries())
+def test_hot_query_uses_an_index(client, name):
+    with engine.begin() as conn:
+        assert _full_scans(conn, hot_queries()[name]) == []
@@ -0,0 +1,138 @@
+import asyncio
+from email import message_from_bytes
+from email.message import EmailMessage
+
+from app.mailer import MailQueue
+
+
+class StandInSMTP:
+    """
+    Just enough of an SMTP server on localhost: records every delivered subject with the
+    connection it came over, answers MAIL FROM with the replies in `refusals` first, and
+    hangs up after `drop_after` deliveries on a connection.
+    """
+
+    def __init__(self, refusals: list[str] = (), drop_after: int | None = None):
+        self.refusals = list(refusals)
+        self.drop_after = drop_after
+        self.delivered: list[tuple[int, str]] = []
+        self.connections = 0
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        connection, delivered = self.connections, 0
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 localhost stand-in")
+        try:
+            while line := await reader.readline():
+                command = line.decode().strip().split(" ")[0].upper()
+                if command in ("EHLO", "HELO"):
+                    await reply("250 localhost")
+                elif command == "MAIL":
+                    await reply(self.refusals.pop(0) if self.refusals else "250 ok")
+                elif command == "DATA":
+                    await reply("354 go ahead")
+                    data = b""
+                    while (line := await reader.readline()) != b".\r\n":
+                        data += line
+                    self.delivered.append((connection, message_from_bytes(data)["subject"]))
+                    delivered += 1
+                    await reply("250 queued")
+                    if delivered == self.drop_after:
+                        return
+                elif command == "QUIT":
+                    await reply("221 bye")
+                    return
+                else:
+                    await reply("250 ok")
+        finally:
+            writer.close()
+
+
+def message(subject: str) -> EmailMessage:
+    em = EmailMessage()
+    em["from"] = "sender@example.com"
+    em["to"] = "receiver@example.com"
+    em["subject"] = subject
+    em.set_content("body")
+    return em
+
+
+def deliver(server: StandInSMTP, subjects: list[str], **options) -> MailQueue:
+    """Queue `subjects`, wait until each one was sent or given up on, then stop the queue."""
+    async def run():
+        port = await server.start()
+        queue = MailQueue("127.0.0.1", port, use_tls=False, retry_backoff=0.01, **options)
+        for subject in subjects:
+            queue.enqueue(message(subject))
+        # retries wait outside the queue, give them time to come back before draining
+        while queue.sent + queue.failed < len(subjects):
+            await asyncio.sleep(0.01)
+        await queue.stop(timeout=5)
+        await server.stop()
+        return queue
+
+    return asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_batch_goes_over_one_connection():
+    server = StandInSMTP()
+    queue = deliver(server, [f"mail {n}" for n in range(5)], batch_size=5)
+
+    assert server.delivered == [(1, f"mail {n}") for n in range(5)]
+    assert queue.sent == 5 and server.connections == 1
+
+
+def test_temporary_failure_is_retried():
+    server = StandInSMTP(refusals=["451 try again later"])
+    queue = deliver(server, ["first", "second"])
+
+    assert sorted(subject for _, subject in server.delivered) == ["first", "second"]
+    assert (queue.sent, queue.retried, queue.failed) == (2, 1, 0)
+
+
+def test_permanent_failure_is_dropped():
+    server = StandInSMTP(refusals=["550 no such mailbox"])
+    queue = deliver(server, ["first", "second"])
+
+    assert [subject for _, subject in server.delivered] == ["second"]
+    assert (queue.sent, queue.retried, queue.failed) == (1, 0, 1)
+
+
+def test_reconnects_after_the_server_hangs_up():
+    server = StandInSMTP(drop_after=1)
+    queue = deliver(server, ["first", "second", "third"], batch_size=3)
+
+    assert sorted(subject for _, subject in server.delivered) == ["first", "second", "third"]
+    assert [connection for connection, _ in server.delivered] == [1, 2, 3]
+    assert queue.sent == 3 and queue.failed == 0
+
+
+def test_stop_drains_the_queue():
+    async def run():
+        server = StandInSMTP()
+        port = await server.start()
+        queue = MailQueue("127.0.0.1", port, use_tls=False, batch_size=2)
+        for n in range(7):
+            queue.enqueue(message(f"mail {n}"))
+        # nothing has gone out yet, the workers haven't run
+        assert not server.delivered
+        await queue.stop(timeout=5)
+        await server.stop()
+        return server, queue
+
+    server, queue = asyncio.run(asyncio.wait_for(run(), 10))
+    assert [subject for _, subject in server.delivered] == [f"mail {n}" for n in range(7)]
+    assert queue.sent == 7 and not queue.started
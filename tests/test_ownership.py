@@ -0,0 +1,75 @@
+from sqlalchemy import select
+
+from app import models
+from app.database import SessionLocal
+from app.ownership import ownership
+
+RESOURCE = {"resource_title": "a resource", "resource_description": "a description", "link": "https://example.com"}
+
+
+def user_id(client, headers) -> int:
+    return client.get("/users/user_info", headers=headers).json()["id"]
+
+
+def counts(project_id: int) -> tuple:
+    with SessionLocal() as db:
+        project = db.get(models.Project, project_id)
+        return project.todo_count, project.completed_todo_count, project.resource_count
+
+
+def stale_setup(client, make_user, project):
+    """Bob's project, todo and resource, with Alice's cache entries claiming all three for her."""
+    alice, bob = make_user("alice"), make_user("bob")
+    project_id = project(bob)
+    client.post(f"/todos/new_todo/{project_id}", json={"task_title": "bob's todo", "task_description": "mine", "completed": True}, headers=bob).raise_for_status()
+    with SessionLocal() as db:
+        todo_id = db.scalar(select(models.Todo.id).where(models.Todo.project_id == project_id))
+    client.post(f"/resource/new_resource/{todo_id}", json=RESOURCE, headers=bob).raise_for_status()
+    with SessionLocal() as db:
+        resource_id = db.scalar(select(models.Resource.id).where(models.Resource.todo_id == todo_id))
+
+    alice_id = user_id(client, alice)
+    ownership.remember_project(project_id, alice_id)
+    ownership.remember_todo(todo_id, alice_id, project_id)
+    ownership.remember_resource(resource_id, alice_id, project_id, todo_id)
+    return alice, project_id, todo_id, resource_id
+
+
+def test_stale_cache_does_not_authorize_deletes(client, make_user, project):
+    alice, project_id, todo_id, resource_id = stale_setup(client, make_user, project)
+
+    assert client.delete(f"/resource/delete_resource/{resource_id}", headers=alice).status_code == 404
+    assert client.delete(f"/todos/delete/{todo_id}", headers=alice).status_code == 404
+
+    with SessionLocal() as db:
+        assert db.get(models.Resource, resource_id) is not None
+        assert db.get(models.Todo, todo_id) is not None
+    assert counts(project_id) == (1, 1, 1)
+
+
+def test_stale_cache_does_not_authorize_inserts(client, make_user, project):
+    alice, project_id, todo_id, _ = stale_setup(client, make_user, project)
+
+    todo = {"task_title": "alice's todo", "task_description": "not mine"}
+    assert client.post(f"/todos/new_todo/{project_id}", json=todo, headers=alice).status_code == 404
+    assert client.post(f"/todos/bulk/{project_id}", json=[todo], headers=alice).status_code == 404
+    assert client.post(f"/resource/new_resource/{todo_id}", json=RESOURCE, headers=alice).status_code == 404
+    assert client.post(f"/resource/bulk/{todo_id}", json=[RESOURCE], headers=alice).status_code == 404
+
+    with SessionLocal() as db:
+        assert db.scalar(select(models.Todo.id).where(models.Todo.project_id == project_id, models.Todo.task_title == todo["task_title"])) is None
+    assert counts(project_id) == (1, 1, 1)
+
+
+def test_stale_cache_does_not_authorize_reads(client, make_user, project):
+    alice, project_id, todo_id, _ = stale_setup(client, make_user, project)
+
+    assert client.get(f"/todos/all_project_todo/{project_id}", headers=alice).status_code == 404
+    assert client.get(f"/resource/todos_resources/{todo_id}", headers=alice).status_code == 404
+
+
+def test_empty_project_lists_no_todos(client, make_user, project):
+    headers = make_user()
+    response = client.get(f"/todos/all_project_todo/{project(headers)}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["items"] == []
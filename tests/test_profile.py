@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+
+from PIL import Image
+from sqlalchemy import select
+
+from app import models
+from app.blobstore import get_blob_store
+from app.database import SessionLocal
+
+
+def png(color: tuple) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(client, headers, data: bytes, method="post", url="/profile/upload/"):
+    return client.request(method, url, files={"file": ("a.png", data, "image/png")}, headers=headers)
+
+
+def user_keys(headers_user: str) -> set[str]:
+    with SessionLocal() as db:
+        image = db.scalars(select(models.ImageModel).join(models.User).where(models.User.username == headers_user)).one()
+        return {image.blob_key, *db.scalars(select(models.ImageVariant.blob_key).where(models.ImageVariant.image_id == image.id))}
+
+
+def username(client, headers) -> str:
+    return client.get("/users/user_info", headers=headers).json()["username"]
+
+
+def test_replacing_an_image_deletes_the_old_blobs(client, make_user):
+    headers = make_user()
+    assert upload(client, headers, png((1, 2, 3))).status_code == 200
+    old_keys = user_keys(username(client, headers))
+    assert len(old_keys) == 4
+
+    assert upload(client, headers, png((4, 5, 6)), "put", "/profile/update").status_code == 200
+
+    store = get_blob_store()
+    assert not any(store.exists(key) for key in old_keys)
+    assert all(store.exists(key) for key in user_keys(username(client, headers)))
+
+
+def test_a_blob_shared_with_another_profile_is_kept(client, make_user):
+    first, second = make_user(), make_user()
+    shared = png((7, 8, 9))
+    upload(client, first, shared)
+    upload(client, second, shared)
+    keys = user_keys(username(client, first))
+
+    upload(client, first, png((10, 11, 12)), "put", "/profile/update")
+
+    assert all(get_blob_store().exists(key) for key in keys)
+
+
+def test_deleting_the_account_deletes_its_blobs(client, make_user):
+    headers = make_user()
+    upload(client, headers, png((13, 14, 15)))
+    keys = user_keys(username(client, headers))
+
+    assert client.delete("/users/delete_account", headers=headers).status_code == 200
+
+    assert not any(get_blob_store().exists(key) for key in keys)
+
+
+def test_oversized_upload_is_refused_before_the_body_is_parsed(client, make_user, monkeypatch):
+    from app.routers import profile
+
+    def never_called(file):
+        raise AssertionError("the upload reached the endpoint")
+
+    monkeypatch.setattr(profile, "store_upload", never_called)
+    response = upload(client, make_user(), os.urandom(1024 * 1024))
+    assert response.status_code == 413
+
+
+def test_a_failed_upload_leaves_no_blob(client, make_user, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    headers = make_user()
+    data = png((16, 17, 18))
+    monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+
+    assert upload(client, headers, data).status_code == 500
+
+    assert not get_blob_store().exists(hashlib.sha256(data).hexdigest())
@@ -0,0 +1,12 @@
+def test_tree_with_a_null_description(client, make_user, project):
+    headers = make_user()
+    project_id = project(headers)
+    client.post(f"/todos/new_todo/{project_id}", json={"task_title": "no description", "task_description": None}, headers=headers).raise_for_status()
+
+    response = client.get(f"/project/{project_id}/full", headers=headers)
+    assert response.status_code == 200
+    assert [todo["task_description"] for todo in response.json()["todos"]] == [None]
+
+    response = client.get("/project/getallprojects", params={"include": "tree"}, headers=headers)
+    assert response.status_code == 200
+    assert [todo["task_description"] for todo in response.json()["items"][0]["todos"]] == [None]
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import select, update
+
+from app import database, models
+from app.database import SessionLocal, make_engines
+
+
+@pytest.fixture
+def replica(client, monkeypatch):
+    """A second SQLite database, a copy of the primary taken now, routed to as the read replica."""
+    path = os.path.join(os.path.dirname(database.engine.url.database), "replica.db")
+    with sqlite3.connect(database.engine.url.database) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    engine, async_engine = make_engines(f"sqlite:///{path}", None, "replica_test")
+    monkeypatch.setattr(database.SyncRoutingSession, "replica", engine)
+    monkeypatch.setattr(database.AsyncRoutingSession, "replica", async_engine.sync_engine)
+    yield engine
+    engine.dispose()
+    async_engine.sync_engine.dispose()
+
+
+def title(engine, project_id: int) -> str | None:
+    with engine.connect() as conn:
+        return conn.scalar(select(models.Project.title).where(models.Project.id == project_id))
+
+
+@pytest.fixture
+def setup(client, make_user, project):
+    headers = make_user()
+    return headers, project(headers, "on both")
+
+
+def test_get_reads_from_the_replica(client, setup, replica):
+    headers, project_id = setup
+    with replica.begin() as conn:
+        conn.execute(update(models.Project).where(models.Project.id == project_id).values(title="replica only"))
+
+    response = client.get(f"/project/get_project/{project_id}/", headers=headers)
+
+    assert response.json()["title"] == "replica only"
+    assert title(database.engine, project_id) == "on both"
+
+
+def test_writes_go_to_the_primary_only(client, setup, replica):
+    headers, project_id = setup
+
+    client.put(f"/project/update/{project_id}", json={"title": "renamed", "brief_description": "brief"}, headers=headers).raise_for_status()
+    response = client.post("/project/new", json={"title": "new one", "brief_description": "brief"}, headers=headers)
+    response.raise_for_status()
+
+    assert title(database.engine, project_id) == "renamed"
+    assert title(replica, project_id) == "on both"
+    assert title(database.engine, response.json()["id"]) == "new one"
+    assert title(replica, response.json()["id"]) is None
+
+
+def test_read_only_session_stays_on_the_primary_after_a_flush(client, setup, replica):
+    _, project_id = setup
+    with replica.begin() as conn:
+        conn.execute(update(models.Project).where(models.Project.id == project_id).values(title="replica only"))
+
+    read = select(models.Project.title).where(models.Project.id == project_id)
+    with SessionLocal(info={"read_only": True}) as db:
+        assert db.scalar(read) == "replica only"
+        db.add(models.Project(title="flushed", brief_description="brief"))
+        db.flush()
+        assert db.scalar(read) == "on both"
+        db.rollback()
+        assert db.scalar(read) == "on both"
+
+    # a write statement without the unit of work moves it the same way
+    with SessionLocal(info={"read_only": True}) as db:
+        assert db.scalar(read) == "replica only"
+        db.execute(update(models.Project).where(models.Project.id == project_id).values(brief_description="written"))
+        assert db.scalar(read) == "on both"
+        db.rollback()
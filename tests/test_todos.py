@@ -0,0 +1,30 @@
+from sqlalchemy import select
+
+from app import models
+from app.database import SessionLocal
+
+
+def test_patch_clears_the_description(client, make_user, project):
+    headers = make_user()
+    project_id = project(headers)
+    client.post(f"/todos/new_todo/{project_id}", json={"task_title": "a todo", "task_description": "some text"}, headers=headers).raise_for_status()
+    with SessionLocal() as db:
+        todo_id = db.scalar(select(models.Todo.id).where(models.Todo.project_id == project_id))
+
+    response = client.patch(f"/todos/update/{todo_id}", json={"task_description": None}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["task_description"] is None
+    assert response.json()["task_title"] == "a todo"
+    with SessionLocal() as db:
+        assert db.get(models.Todo, todo_id).task_description is None
+
+
+def test_patch_rejects_a_null_title(client, make_user, project):
+    headers = make_user()
+    project_id = project(headers)
+    client.post(f"/todos/new_todo/{project_id}", json={"task_title": "a todo", "task_description": None}, headers=headers).raise_for_status()
+    with SessionLocal() as db:
+        todo_id = db.scalar(select(models.Todo.id).where(models.Todo.project_id == project_id))
+
+    assert client.patch(f"/todos/update/{todo_id}", json={"task_title": None}, headers=headers).status_code == 422
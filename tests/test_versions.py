@@ -0,0 +1,14 @@
+def test_pages_get_their_own_etag(client, make_user, project):
+    headers = make_user()
+    for n in range(3):
+        project(headers, f"project {n}")
+
+    first = client.get("/project/getallprojects", params={"limit": 1}, headers=headers)
+    second = client.get("/project/getallprojects", params={"limit": 1, "cursor": first.json()["next"]}, headers=headers)
+    assert first.headers["etag"] != second.headers["etag"]
+
+    conditional = {**headers, "If-None-Match": first.headers["etag"]}
+    assert client.get("/project/getallprojects", params={"limit": 1}, headers=conditional).status_code == 304
+    response = client.get("/project/getallprojects", params={"limit": 1, "cursor": first.json()["next"]}, headers=conditional)
+    assert response.status_code == 200
+    assert response.json() == second.json()